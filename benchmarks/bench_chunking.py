@@ -0,0 +1,105 @@
+from __future__ import annotations
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from typing import List
+
+import regex as re
+
+from docintel.chunking import iter_chunks
+
+def legacy_chunk_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    # Eager implementation that shipped before iter_chunks, kept as the comparison baseline.
+    parts = re.split(r"\n\n+|(?<=[.!?])\s+", text)
+    parts = [p.strip() for p in parts if p and p.strip()]
+    chunks: List[str] = []
+    cur: List[str] = []
+    cur_len = 0
+
+    def flush():
+        nonlocal cur, cur_len
+        if cur:
+            chunks.append(" ".join(cur).strip())
+            cur = []
+            cur_len = 0
+
+    for part in parts:
+        plen = len(part)
+        if cur_len + plen + 1 <= chunk_size:
+            cur.append(part)
+            cur_len += plen + 1
+            continue
+        flush()
+        if plen > chunk_size:
+            start = 0
+            while start < plen:
+                end = min(start + chunk_size, plen)
+                chunks.append(part[start:end].strip())
+                start = max(end - chunk_overlap, start + 1)
+        else:
+            cur.append(part)
+            cur_len = plen + 1
+    flush()
+
+    if chunk_overlap > 0 and len(chunks) > 1:
+        overlapped: List[str] = []
+        prev_tail = ""
+        for c in chunks:
+            overlapped.append((prev_tail + " " + c).strip() if prev_tail else c)
+            prev_tail = c[-chunk_overlap:]
+        chunks = overlapped
+    return [c for c in chunks if c.strip()]
+
+def make_text(mb: float) -> str:
+    para = (
+        "The Supplier shall deliver the Goods within thirty days of the Order. "
+        "Payment terms are net 30 from the invoice date!  Either party may terminate on notice? "
+        "This Agreement is governed by the laws of Ontario.\n\n"
+    )
+    return para * int(mb * 1024 * 1024 / len(para))
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def run_child(impl: str, mb: float, chunk_size: int, chunk_overlap: int) -> dict:
+    text = make_text(mb)
+    base_rss = _max_rss_mb()
+    t0 = time.perf_counter()
+    if impl == "legacy":
+        n = len(legacy_chunk_text(text, chunk_size, chunk_overlap))
+    else:
+        n = sum(1 for _ in iter_chunks(text, chunk_size, chunk_overlap))
+    dt = time.perf_counter() - t0
+    return {
+        "impl": impl,
+        "input_mb": round(len(text) / (1024 * 1024), 2),
+        "chunks": n,
+        "seconds": round(dt, 3),
+        "mb_per_s": round(len(text) / (1024 * 1024) / dt, 2),
+        "peak_rss_delta_mb": round(_max_rss_mb() - base_rss, 1),
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compare eager chunk_text against streaming iter_chunks.")
+    ap.add_argument("--mb", type=float, default=50.0)
+    ap.add_argument("--chunk-size", type=int, default=1200)
+    ap.add_argument("--chunk-overlap", type=int, default=200)
+    ap.add_argument("--child", choices=["legacy", "streaming"])
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.mb, args.chunk_size, args.chunk_overlap)))
+        return
+
+    for impl in ("legacy", "streaming"):
+        # Each implementation runs in a fresh interpreter so peak RSS is not shared.
+        cmd = [sys.executable, __file__, "--child", impl, "--mb", str(args.mb),
+               "--chunk-size", str(args.chunk_size), "--chunk-overlap", str(args.chunk_overlap)]
+        print(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.strip())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+# Every stage runs against the in-process stub backend; no API key or network needed.
+os.environ.setdefault("DI_LLM_BACKEND", "stub")
+os.environ.setdefault("DI_MAX_RPS", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+
+from docintel import api
+from docintel.chunking import build_chunks
+from docintel.ingest import load_document
+
+SAMPLES = Path(__file__).resolve().parent.parent / "data" / "samples"
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+def _report(bench: str, latencies: List[float], errors: int, elapsed: float, concurrency: int, **extra) -> None:
+    n = len(latencies) + errors
+    print(json.dumps({
+        "bench": bench,
+        "requests": n,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(n / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "peak_rss_mb": _peak_rss_mb(),
+        **extra,
+    }), flush=True)
+
+async def _drive(n: int, concurrency: int, call: Callable[[int], Awaitable[bool]]):
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def _one(i: int) -> None:
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            ok = await call(i)
+            if ok:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[_one(i) for i in range(n)])
+    return latencies, errors, time.perf_counter() - t0
+
+def _doc_text(i: int) -> str:
+    # Distinct text per request so neither cache tier turns the run into a lookup benchmark.
+    base = (SAMPLES / "sample_contract.txt").read_text(encoding="utf-8")
+    return f"{base}\n\nReference {i}."
+
+async def bench_api_extract(args) -> None:
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def _call(i: int) -> bool:
+            r = await client.post("/extract", json={"schema": "contract", "raw_text": _doc_text(i), "doc_id": f"d{i}"})
+            return r.status_code == 200
+
+        latencies, errors, elapsed = await _drive(args.requests, args.concurrency, _call)
+    _report("api_extract", latencies, errors, elapsed, args.concurrency)
+
+async def bench_api_batch(args) -> None:
+    transport = httpx.ASGITransport(app=api.app)
+    size = args.batch_size
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        async def _call(i: int) -> bool:
+            items = [{"raw_text": _doc_text(i * size + j), "doc_id": f"b{i}-{j}", "schema": "contract"} for j in range(size)]
+            r = await client.post("/extract/batch", json={"schema": "contract", "items": items})
+            return r.status_code == 200 and all(x["ok"] for x in r.json()["results"])
+
+        batches = max(1, args.requests // size)
+        latencies, errors, elapsed = await _drive(batches, args.concurrency, _call)
+    _report("api_batch", latencies, errors, elapsed, args.concurrency, batch_size=size, docs_per_s=round(batches * size / elapsed, 2))
+
+async def bench_cli(args) -> None:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(Path(api.__file__).parent.parent), os.environ.get("PYTHONPATH", "")]))
+    runs = max(1, args.requests // 10)
+
+    async def _call(i: int) -> bool:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "docintel.cli", "extract", str(SAMPLES / "sample_invoice.txt"), "--schema", "invoice",
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env,
+        )
+        return await proc.wait() == 0
+
+    latencies, errors, elapsed = await _drive(runs, args.concurrency, _call)
+    _report("cli_extract", latencies, errors, elapsed, args.concurrency, peak_child_rss_mb=_peak_rss_mb(resource.RUSAGE_CHILDREN))
+
+async def bench_chunking(args) -> None:
+    text = (SAMPLES / "sample_contract.txt").read_text(encoding="utf-8") * 400
+    latencies: List[float] = []
+    t0 = time.perf_counter()
+    for i in range(args.requests):
+        t = time.perf_counter()
+        build_chunks(f"d{i}", text, 1200, 200)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - t0
+    _report("chunking", latencies, 0, elapsed, 1, input_kb=round(len(text) / 1024, 1),
+            mb_per_s=round(len(text) * args.requests / elapsed / 1e6, 2))
+
+async def bench_ingest(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.requests):
+            p = Path(tmp) / f"doc{i}.txt"
+            p.write_text(_doc_text(i) * 50, encoding="utf-8")
+            paths.append(p)
+
+        async def _call(i: int) -> bool:
+            await asyncio.to_thread(load_document, paths[i])
+            return True
+
+        latencies, errors, elapsed = await _drive(len(paths), args.concurrency, _call)
+    _report("ingest_txt", latencies, errors, elapsed, args.concurrency)
+
+BENCHES: Dict[str, Callable] = {
+    "api_extract": bench_api_extract,
+    "api_batch": bench_api_batch,
+    "cli": bench_cli,
+    "chunking": bench_chunking,
+    "ingest": bench_ingest,
+}
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="End-to-end throughput/latency against the stub LLM backend (JSON lines).")
+    ap.add_argument("benches", nargs="*", metavar="BENCH", help=f"Any of {', '.join(BENCHES)} (default: all)")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--batch-size", type=int, default=10)
+    ap.add_argument("--latency-ms", type=float, default=50.0, help="Median stub completion latency")
+    ap.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of stub calls answered with 429")
+    ap.add_argument("--cache", action="store_true", help="Keep the result/LLM caches on (off by default)")
+    args = ap.parse_args()
+
+    os.environ["DI_STUB_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["DI_STUB_THROTTLE_RATE"] = str(args.throttle_rate)
+    os.environ["DI_ENABLE_CACHE"] = "true" if args.cache else "false"
+    os.environ.setdefault("DI_CACHE_DIR", tempfile.mkdtemp(prefix="di-bench-"))
+    # Span export goes to stdout by default and would interleave with the JSON report.
+    api.configure_tracing = lambda cfg: None
+
+    names = args.benches or list(BENCHES)
+    for name in names:
+        if name not in BENCHES:
+            ap.error(f"unknown bench {name!r}")
+    for name in names:
+        asyncio.run(BENCHES[name](args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import argparse
+import json
+import logging
+import re
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from docintel.config import DISettings
+from docintel.eval import load_golden
+from docintel.extractor import SchemaExtractor, _validate
+from docintel.ingest import load_document
+from docintel.prompts import FIELD_REPAIR_SYSTEM, build_extraction_messages
+from docintel.schemas import SCHEMA_REGISTRY
+
+# Reference answers for the eval set; the damaged replies below are derived from these.
+ANSWERS = {
+    "contract": {
+        "counterparty": "Alpha Widgets Inc.",
+        "effective_date": "2024-01-01",
+        "end_date": None,
+        "governing_law": "Ontario, Canada",
+        "payment_terms": "Net 30",
+        "obligations": ["Supplier delivers widgets monthly", "Customer pays within 30 days"],
+    },
+    "invoice": {
+        "vendor": "ACME Supplies",
+        "invoice_number": "INV-10023",
+        "invoice_date": "2024-03-15",
+        "currency": "USD",
+        "total_amount": 1250.0,
+        "tax_amount": 150.0,
+        "line_items": ["Widgets x100", "Shipping"],
+    },
+}
+
+def _damaged(answer: dict) -> dict:
+    clean = json.dumps(answer, ensure_ascii=False, indent=2)
+    first_list = next(k for k, v in answer.items() if isinstance(v, list))
+    wrong_type = dict(answer, **{first_list: ", ".join(answer[first_list])})
+    return {
+        "clean": clean,
+        "fenced": f"```json\n{clean}\n```",
+        "prose_with_braces": f"Here is the result:\n{clean}\nNote: fields in {{braces}} were inferred.",
+        "trailing_commas": clean.replace("\n}", ",\n}").replace('"\n  ]', '",\n  ]'),
+        "python_literals": repr(answer),
+        "truncated_75": clean[: int(len(clean) * 0.75)],
+        "truncated_90": clean[: int(len(clean) * 0.9)],
+        "wrong_field_type": json.dumps(wrong_type, ensure_ascii=False),
+    }
+
+class _ScriptedLLM:
+    def __init__(self, first: str, answer: dict):
+        self._first = first
+        self._answer = answer
+        self.reask_chars = 0
+        self.calls = 0
+
+    def complete(self, messages):
+        self.calls += 1
+        if self.calls == 1:
+            return self._first
+        self.reask_chars += sum(len(m["content"]) for m in messages)
+        if messages[0]["content"] == FIELD_REPAIR_SYSTEM:
+            wanted = json.loads(messages[-1]["content"])["fields"]
+            return json.dumps({k: self._answer.get(k) for k in wanted})
+        return json.dumps(self._answer)
+
+def _legacy_needs_reask(schema_model, raw: str) -> bool:
+    # Previous parser: greedy first-to-last brace, trailing-comma regex, full re-ask on any failure.
+    m = re.search(r"\{.*\}", raw, re.DOTALL)
+    if not m:
+        return True
+    try:
+        _validate(schema_model, json.loads(re.sub(r",\s*([}\]])", r"\1", m.group(0))))
+        return False
+    except (ValueError, ValidationError):
+        return True
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="LLM re-ask rate on the eval set: legacy parser vs local repair + field re-ask.")
+    ap.add_argument("--golden", default="eval/golden.json")
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+
+    totals = {"replies": 0, "legacy_reasks": 0, "legacy_reask_chars": 0, "field_reasks": 0, "full_reasks": 0, "reask_chars": 0}
+    for case in load_golden(Path(args.golden)):
+        model = SCHEMA_REGISTRY[case.schema]
+        doc = load_document(Path(case.doc_path))
+        full_prompt = build_extraction_messages(model, doc.text, doc.doc_id)
+        full_chars = sum(len(m["content"]) for m in full_prompt) * 2
+        answer = ANSWERS[case.schema]
+        for kind, raw in _damaged(answer).items():
+            legacy = _legacy_needs_reask(model, raw)
+            llm = _ScriptedLLM(raw, answer)
+            ext = SchemaExtractor(llm, DISettings(enable_cache=False))
+            ext.extract_sync(case.schema, model, doc.doc_id, doc.text)
+            row = {
+                "schema": case.schema,
+                "damage": kind,
+                "legacy_reask": legacy,
+                "field_reask": ext.repairs.field_repairs,
+                "full_reask": ext.repairs.full_repairs,
+            }
+            print(json.dumps(row))
+            totals["replies"] += 1
+            totals["legacy_reasks"] += int(legacy)
+            totals["legacy_reask_chars"] += full_chars if legacy else 0
+            totals["field_reasks"] += ext.repairs.field_repairs
+            totals["full_reasks"] += ext.repairs.full_repairs
+            totals["reask_chars"] += llm.reask_chars
+
+    n = totals["replies"]
+    print(json.dumps({
+        **totals,
+        "legacy_reask_rate": round(totals["legacy_reasks"] / n, 3),
+        "reask_rate": round((totals["field_reasks"] + totals["full_reasks"]) / n, 3),
+    }))
+
+if __name__ == "__main__":
+    main()
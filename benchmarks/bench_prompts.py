@@ -0,0 +1,59 @@
+from __future__ import annotations
+import argparse
+import json
+import time
+
+from docintel.hashing import sha256_json, sha256_messages
+from docintel.prompts import SYSTEM, build_extraction_messages
+from docintel.schemas import SCHEMA_REGISTRY
+
+HINT = "Chunks are labeled. Use them to ground extracted facts."
+
+def legacy_build(schema_model, doc_text: str, doc_id: str, chunk_hint: str | None = None) -> list[dict]:
+    # Previous implementation: schema regenerated and the whole payload JSON-encoded on every call.
+    user = {
+        "task": "extract",
+        "doc_id": doc_id,
+        "schema": schema_model.model_json_schema(),
+        "document": doc_text if chunk_hint is None else f"{chunk_hint}\n\n{doc_text}",
+    }
+    return [{"role": "system", "content": SYSTEM}, {"role": "user", "content": json.dumps(user, ensure_ascii=False)}]
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Prompt assembly + cache key cost on large inputs.")
+    ap.add_argument("--mb", type=float, nargs="+", default=[0.1, 1.0, 5.0])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    model = SCHEMA_REGISTRY["contract"]
+    line = 'The "Supplier" shall deliver — net 30 — per §4.\n'
+
+    for mb in args.mb:
+        doc = line * int(mb * 1024 * 1024 / len(line))
+
+        def _legacy():
+            msgs = legacy_build(model, doc, "doc-1", chunk_hint=HINT)
+            sha256_json({"model": "gpt-4o-mini", "messages": msgs})
+
+        def _compiled():
+            msgs = build_extraction_messages(model, doc, "doc-1", chunk_hint=HINT)
+            sha256_messages("gpt-4o-mini", msgs)
+
+        legacy_s = _time(_legacy, args.repeat)
+        compiled_s = _time(_compiled, args.repeat)
+        print(json.dumps({
+            "input_mb": mb,
+            "legacy_ms": round(legacy_s * 1000, 2),
+            "compiled_ms": round(compiled_s * 1000, 2),
+            "speedup": round(legacy_s / compiled_s, 2),
+        }))
+
+if __name__ == "__main__":
+    main()
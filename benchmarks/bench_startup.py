@@ -0,0 +1,87 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# Every measurement runs in a fresh interpreter; the parent process never imports docintel.
+SRC = Path(__file__).resolve().parent.parent / "src"
+SAMPLE = Path(__file__).resolve().parent.parent / "data" / "samples" / "sample_contract.txt"
+
+_IMPORT = "import time; t0 = time.perf_counter(); import {module}; print(time.perf_counter() - t0)"
+
+# Time from process start to the app being ready, then the first and second /extract over ASGI.
+_API_COLD = """
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import httpx
+from docintel import api
+api.configure_tracing = lambda cfg: None
+text = open(sys.argv[1], encoding="utf-8").read()
+
+async def main():
+    transport = httpx.ASGITransport(app=api.app)
+    async with api.app.router.lifespan_context(api.app):
+        ready = time.perf_counter() - t0
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            out = {"import_and_startup_s": ready}
+            for i, name in enumerate(("first_extract_s", "second_extract_s")):
+                t = time.perf_counter()
+                r = await client.post("/extract", json={"schema": "contract", "raw_text": f"{text} {i}"})
+                assert r.status_code == 200, r.text
+                out[name] = time.perf_counter() - t
+    print(json.dumps(out))
+
+asyncio.run(main())
+"""
+
+def _env(extra: Dict[str, str]) -> Dict[str, str]:
+    return dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([str(SRC), os.environ.get("PYTHONPATH", "")]),
+        DI_LLM_BACKEND="stub", DI_STUB_LATENCY_MS="0", DI_MAX_RPS="0", DI_ENABLE_CACHE="false",
+        LOG_LEVEL="WARNING", **extra,
+    )
+
+def _run(argv: List[str], env: Dict[str, str]) -> tuple[float, str]:
+    t0 = time.perf_counter()
+    out = subprocess.run(argv, env=env, check=True, capture_output=True, text=True).stdout
+    return time.perf_counter() - t0, out
+
+def _report(bench: str, samples: List[float], **extra) -> None:
+    print(json.dumps({
+        "bench": bench,
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        **extra,
+    }), flush=True)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Import time and cold start of the CLI and API entry points (JSON lines).")
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+    env = _env({"DI_CACHE_DIR": tempfile.mkdtemp(prefix="di-bench-")})
+
+    for module in ("docintel.cli", "docintel.api"):
+        samples = [float(_run([sys.executable, "-c", _IMPORT.format(module=module)], env)[1]) for _ in range(args.runs)]
+        _report(f"import_{module.split('.')[1]}", samples)
+
+    _report("cli_help", [_run([sys.executable, "-m", "docintel.cli", "--help"], env)[0] for _ in range(args.runs)])
+    _report("cli_extract_txt", [
+        _run([sys.executable, "-m", "docintel.cli", "extract", str(SAMPLE), "--schema", "contract"], env)[0] for _ in range(args.runs)
+    ])
+
+    # Only the last stdout line is ours; warnings logged during startup also go to stdout.
+    rows = [json.loads(_run([sys.executable, "-c", _API_COLD, str(SAMPLE)], env)[1].splitlines()[-1]) for _ in range(args.runs)]
+    for key in rows[0]:
+        _report(f"api_{key[:-2]}", [r[key] for r in rows])
+
+if __name__ == "__main__":
+    main()
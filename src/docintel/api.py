@@ -1,23 +1,73 @@
 from __future__ import annotations
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager, nullcontext
+from fastapi import FastAPI, File, Form, Header, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from pathlib import Path
+import asyncio
 import base64
-from typing import List, Optional
-
-from openai import AsyncOpenAI
-from aiolimiter import AsyncLimiter
+import io
+import json
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+import logging
 
 from docintel.config import get_settings
 from docintel.logging import configure_logging
 from docintel.tracing import configure_tracing, TracingConfig
-from docintel.cache import DiskCache
-from docintel.ingest import load_document, Document, normalize_text
+from docintel.cache import MemoryCache, TieredCache, build_disk_cache
+from docintel.ingest import load_document_stream, Document, normalize_text, shutdown_pdf_pool
 from docintel.schemas import SCHEMA_REGISTRY
-from docintel.llm import AsyncLLMClient
-from docintel.extractor import AsyncSchemaExtractor
+from docintel.llm import AsyncLLMClient, build_async_openai_client
+from docintel.concurrency import build_concurrency, build_hedging
+from docintel.ratelimit import build_limiter, build_token_budget
+from docintel.extractor import AsyncSchemaExtractor, schema_version
+from docintel.metrics import get_estimator
+from docintel.prompts import compile_prompt
+from docintel.jobs import JobRunner, JobStore, result_row
+from docintel.telemetry import IN_FLIGHT, REGISTRY, sampled_profile, stage, traced
+
+log = logging.getLogger("docintel.api")
+
+_JOBS_DB = "jobs.sqlite3"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    s = get_settings()
+    # The server only accepts connections once startup returns, so /health cannot report ready cold.
+    if s.warmup:
+        warm_up()
+    # Resume persisted job items left over from a previous process.
+    if (s.cache_dir / _JOBS_DB).exists():
+        _init_once()
+        store, _ = _jobs()
+        if store.pending_count():
+            log.info("Resuming unfinished jobs", extra={"component": "api", "event": "jobs_resume"})
+    yield
+    if "jobs_runner" in _state:
+        await _state["jobs_runner"].stop()
+    if _state.get("cache") is not None:
+        # Also persists the per-prefix lookup counters `docintel cache stats` reports.
+        _state["cache"].close()
+    shutdown_pdf_pool()
+
+app = FastAPI(title="Document Intelligence API", version="0.2.0", lifespan=lifespan)
 
-app = FastAPI(title="Document Intelligence API", version="0.2.0")
+class _InFlight:
+    # Plain ASGI so streamed bodies count until their last chunk, without BaseHTTPMiddleware's per-request cost.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            IN_FLIGHT.dec()
+
+app.add_middleware(_InFlight)
 
 class ExtractRequest(BaseModel):
     schema: str
@@ -25,6 +75,13 @@ class ExtractRequest(BaseModel):
     base64_file: Optional[str] = None
     filename: Optional[str] = None
     doc_id: Optional[str] = None
+    debug: bool = False
+
+class DebugInfo(BaseModel):
+    timings_ms: Dict[str, float]
+    total_ms: float
+    retries: int
+    profile: Optional[str] = None
 
 class ExtractResponse(BaseModel):
     schema: str
@@ -36,14 +93,36 @@ class ExtractResponse(BaseModel):
     completion_tokens_est: int
     total_tokens_est: int
     cost_est_usd: float
+    hedged_requests: int = 0
+    debug: Optional[DebugInfo] = None
 
 class BatchRequest(BaseModel):
     schema: str
     items: List[ExtractRequest]
 
+class BatchItemResult(BaseModel):
+    index: int
+    ok: bool
+    result: Optional[ExtractResponse] = None
+    error: Optional[str] = None
+
 class BatchResponse(BaseModel):
     schema: str
-    results: List[ExtractResponse]
+    results: List[BatchItemResult]
+
+class JobCreated(BaseModel):
+    job_id: str
+    total: int
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    schema: str
+    state: str
+    total: int
+    pending: int
+    running: int
+    done: int
+    failed: int
 
 _state = {}
 
@@ -56,38 +135,182 @@ def _init_once():
 
     cache = None
     if s.enable_cache:
-        s.cache_dir.mkdir(parents=True, exist_ok=True)
-        cache = DiskCache(str(s.cache_dir))
+        cache = TieredCache(build_disk_cache(s), MemoryCache(s.memory_cache_max_items, s.memory_cache_ttl_s))
+
+    limiter = build_limiter(s)
 
-    limiter = AsyncLimiter(max_rate=s.max_rps, time_period=1) if s.max_rps > 0 else None
+    concurrency = build_concurrency(s)
 
-    aclient = AsyncOpenAI()
-    allm = AsyncLLMClient(aclient, s.llm_model, cache, s.llm_cache_ttl_s, s.max_retries, s.request_timeout_s, limiter=limiter)
-    aext = AsyncSchemaExtractor(allm, s)
+    # With adaptive concurrency on, 429s must reach our controller instead of the SDK's own retry loop.
+    aclient = build_async_openai_client(s, sdk_retries=concurrency is None)
+    allm = AsyncLLMClient(
+        aclient, s.llm_model, cache, s.llm_cache_ttl_s, s.max_retries, s.request_timeout_s,
+        limiter=limiter, concurrency=concurrency, budget=build_token_budget(s), hedging=build_hedging(s),
+    )
+    aext = AsyncSchemaExtractor(allm, s, cache=cache)
+
+    _state.update({"s": s, "cache": cache, "aext": aext, "concurrency": concurrency, "hedging": allm.hedging})
 
-    _state.update({"s": s, "cache": cache, "aext": aext})
+def warm_up() -> float:
+    # Pays the first request's one-off costs up front: clients, token encoder, schema JSON, cache files.
+    t0 = time.perf_counter()
+    _init_once()
+    s = _state["s"]
+    get_estimator(s.llm_model).count("warm-up")
+    # openai builds its response models' validators on first use, i.e. while parsing the first completion.
+    from openai.types.chat import ChatCompletion, ChatCompletionChunk
+    ChatCompletion.model_rebuild()
+    ChatCompletionChunk.model_rebuild()
+    for model in SCHEMA_REGISTRY.values():
+        compile_prompt(model)
+        schema_version(model)
+    if _state["cache"] is not None:
+        _state["cache"].warm()
+    elapsed = time.perf_counter() - t0
+    _state["warmup_s"] = elapsed
+    log.info("Warm-up finished", extra={"component": "api", "event": "warmup"})
+    return elapsed
 
 def _document_from_request(req: ExtractRequest) -> Document:
     if req.raw_text:
         did = req.doc_id or "inline"
-        return Document(doc_id=did, source_path="inline", text=normalize_text(req.raw_text))
+        with stage("ingest"):
+            text = normalize_text(req.raw_text)
+        return Document(doc_id=did, source_path="inline", text=text)
     if req.base64_file and req.filename:
-        s = _state["s"]
-        tmp_dir = s.cache_dir / "_uploads"
-        tmp_dir.mkdir(parents=True, exist_ok=True)
-        data = base64.b64decode(req.base64_file.encode("utf-8"))
-        p = tmp_dir / req.filename
-        p.write_bytes(data)
-        return load_document(p, doc_id=req.doc_id or req.filename)
+        data = io.BytesIO(base64.b64decode(req.base64_file))
+        return _load_upload(data, req.filename, req.doc_id)
     raise ValueError("Provide either raw_text or base64_file + filename")
 
+def _load_upload(stream, filename: str, doc_id: Optional[str]) -> Document:
+    s = _state["s"]
+    return load_document_stream(
+        stream,
+        Path(filename).name,
+        doc_id=doc_id,
+        cache=_state["cache"],
+        pdf_workers=s.pdf_workers,
+        spool_dir=s.cache_dir / "_uploads",
+    )
+
+@asynccontextmanager
+async def _request_scope(debug: bool) -> AsyncIterator[Callable[[], Optional[DebugInfo]]]:
+    # Yields a callable that snapshots the timing breakdown so far (None unless debug was asked for).
+    s = _state["s"]
+    t0 = time.perf_counter()
+    async with sampled_profile(s.profile_sample_rate, s.profile_dir or s.cache_dir / "profiles") as profile:
+        with traced() if debug else nullcontext() as trace:
+
+            def _snapshot() -> Optional[DebugInfo]:
+                if trace is None:
+                    return None
+                stages, retries = trace.snapshot()
+                return DebugInfo(
+                    timings_ms={k: round(v * 1000, 3) for k, v in stages.items()},
+                    total_ms=round((time.perf_counter() - t0) * 1000, 3),
+                    retries=retries,
+                    profile=str(profile) if profile else None,
+                )
+
+            yield _snapshot
+
+def _jobs():
+    if "jobs" not in _state:
+        s = _state["s"]
+        store = JobStore(s.cache_dir / _JOBS_DB, lease_s=s.jobs_lease_s)
+        runner = JobRunner(store, _process_job_item, concurrency=s.jobs_concurrency)
+        _state.update({"jobs": store, "jobs_runner": runner})
+    runner: JobRunner = _state["jobs_runner"]
+    runner.start()
+    return _state["jobs"], runner
+
+async def _process_job_item(schema_name: str, request: dict) -> dict:
+    model = SCHEMA_REGISTRY.get(schema_name)
+    if not model:
+        raise ValueError(f"Unknown schema: {schema_name}")
+    item = ExtractRequest(**request)
+    doc = await asyncio.to_thread(_document_from_request, item)
+    res, usage, cost = await _state["aext"].extract(schema_name, model, doc.doc_id, doc.text)
+    return _to_response(schema_name, res, usage, cost).model_dump()
+
+def _to_response(schema_name: str, res, usage, cost: float) -> ExtractResponse:
+    return ExtractResponse(
+        schema=schema_name,
+        doc_id=res.doc_id,
+        data=res.data,
+        confidence=res.confidence,
+        used_chunks=res.used_chunks,
+        prompt_tokens_est=usage.prompt_tokens,
+        completion_tokens_est=usage.completion_tokens,
+        total_tokens_est=usage.total_tokens,
+        cost_est_usd=cost,
+        hedged_requests=usage.hedged_requests,
+    )
+
 @app.get("/health")
 def health():
     _init_once()
-    return {"status": "ok"}
+    out = {"status": "ok", "warmed_up": "warmup_s" in _state}
+    concurrency = _state.get("concurrency")
+    if concurrency is not None:
+        out["llm_concurrency"] = concurrency.snapshot()
+    hedging = _state.get("hedging")
+    if hedging is not None:
+        out["llm_hedging"] = hedging.snapshot()
+    return out
+
+def _collect():
+    # Read at scrape time from the stats the components already keep, so the hot path pays nothing.
+    cache = _state.get("cache")
+    if cache is not None:
+        tiers = cache.stats()
+        yield "docintel_cache_hits_total", "counter", "Cache hits per tier.", [({"tier": t}, st.hits) for t, st in tiers.items()]
+        yield "docintel_cache_misses_total", "counter", "Cache misses per tier.", [({"tier": t}, st.misses) for t, st in tiers.items()]
+    repairs = getattr(_state.get("aext"), "repairs", None)
+    if repairs is not None:
+        yield "docintel_completions_total", "counter", "Extraction completions parsed and validated.", [({}, repairs.calls)]
+        yield "docintel_repair_calls_total", "counter", "Extra LLM calls made to repair output.", [
+            ({"kind": "field"}, repairs.field_repairs), ({"kind": "full"}, repairs.full_repairs),
+        ]
+        yield "docintel_repair_call_rate", "gauge", "Repair calls per completion.", [({}, repairs.repair_call_rate)]
+    concurrency = _state.get("concurrency")
+    if concurrency is not None:
+        snap = concurrency.snapshot()
+        yield "docintel_llm_concurrency_limit", "gauge", "Current adaptive LLM concurrency limit.", [({}, snap["limit"])]
+        yield "docintel_llm_in_flight", "gauge", "LLM calls holding a concurrency slot.", [({}, snap["in_flight"])]
+    hedging = _state.get("hedging")
+    if hedging is not None:
+        yield "docintel_llm_hedges_total", "counter", "Hedged LLM requests.", [({"outcome": "fired"}, hedging.fired), ({"outcome": "won"}, hedging.won)]
+
+REGISTRY.add_collector(_collect)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    _init_once()
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.post("/extract", response_model=ExtractResponse)
-async def extract(req: ExtractRequest):
+async def extract(req: ExtractRequest, x_debug: bool = Header(False)):
+    _init_once()
+    schema_name = req.schema
+    model = SCHEMA_REGISTRY.get(schema_name)
+    if not model:
+        raise HTTPException(status_code=400, detail=f"Unknown schema: {schema_name}")
+
+    async with _request_scope(req.debug or x_debug) as debug_info:
+        try:
+            doc = await asyncio.to_thread(_document_from_request, req)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        aext: AsyncSchemaExtractor = _state["aext"]
+        res, usage, cost = await aext.extract(schema_name, model, doc.doc_id, doc.text)
+        out = _to_response(schema_name, res, usage, cost)
+        out.debug = debug_info()
+    return out
+
+@app.post("/extract/stream")
+async def extract_stream(req: ExtractRequest):
     _init_once()
     schema_name = req.schema
     model = SCHEMA_REGISTRY.get(schema_name)
@@ -95,24 +318,54 @@ async def extract(req: ExtractRequest):
         raise HTTPException(status_code=400, detail=f"Unknown schema: {schema_name}")
 
     try:
-        doc = _document_from_request(req)
+        doc = await asyncio.to_thread(_document_from_request, req)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
     aext: AsyncSchemaExtractor = _state["aext"]
-    res, usage, cost = await aext.extract(schema_name, model, doc.doc_id, doc.text)
 
-    return ExtractResponse(
-        schema=schema_name,
-        doc_id=res.doc_id,
-        data=res.data,
-        confidence=res.confidence,
-        used_chunks=res.used_chunks,
-        prompt_tokens_est=usage.prompt_tokens,
-        completion_tokens_est=usage.completion_tokens,
-        total_tokens_est=usage.total_tokens,
-        cost_est_usd=cost,
-    )
+    # NDJSON: one {"event": "field", ...} line per completed field, then {"event": "result", ...}.
+    # A client disconnect cancels this generator, which closes the upstream completion stream.
+    async def _events():
+        try:
+            async for kind, payload in aext.extract_stream(schema_name, model, doc.doc_id, doc.text):
+                if kind == "field":
+                    line = {"event": "field", "name": payload[0], "value": payload[1]}
+                else:
+                    line = {"event": "result", "result": _to_response(schema_name, *payload).model_dump()}
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        except Exception as e:
+            log.warning("Streaming extraction failed", extra={"component": "api", "event": "stream_error", "doc_id": doc.doc_id, "schema": schema_name})
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(_events(), media_type="application/x-ndjson")
+
+@app.post("/extract/upload", response_model=ExtractResponse)
+async def extract_upload(
+    schema: str = Form(...),
+    file: UploadFile = File(...),
+    doc_id: Optional[str] = Form(None),
+    debug: bool = Form(False),
+    x_debug: bool = Header(False),
+):
+    _init_once()
+    model = SCHEMA_REGISTRY.get(schema)
+    if not model:
+        raise HTTPException(status_code=400, detail=f"Unknown schema: {schema}")
+
+    async with _request_scope(debug or x_debug) as debug_info:
+        try:
+            doc = await asyncio.to_thread(_load_upload, file.file, file.filename or "upload.txt", doc_id)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            await file.close()
+
+        aext: AsyncSchemaExtractor = _state["aext"]
+        res, usage, cost = await aext.extract(schema, model, doc.doc_id, doc.text)
+        out = _to_response(schema, res, usage, cost)
+        out.debug = debug_info()
+    return out
 
 @app.post("/extract/batch", response_model=BatchResponse)
 async def extract_batch(req: BatchRequest):
@@ -123,23 +376,62 @@ async def extract_batch(req: BatchRequest):
         raise HTTPException(status_code=400, detail=f"Unknown schema: {schema_name}")
 
     aext: AsyncSchemaExtractor = _state["aext"]
-    results = []
-    for item in req.items:
-        item.schema = schema_name
-        try:
-            doc = _document_from_request(item)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=str(e))
-        res, usage, cost = await aext.extract(schema_name, model, doc.doc_id, doc.text)
-        results.append(ExtractResponse(
-            schema=schema_name,
-            doc_id=res.doc_id,
-            data=res.data,
-            confidence=res.confidence,
-            used_chunks=res.used_chunks,
-            prompt_tokens_est=usage.prompt_tokens,
-            completion_tokens_est=usage.completion_tokens,
-            total_tokens_est=usage.total_tokens,
-            cost_est_usd=cost,
-        ))
-    return BatchResponse(schema=schema_name, results=results)
+    sem = asyncio.Semaphore(_state["s"].batch_concurrency)
+
+    async def _run(index: int, item: ExtractRequest) -> BatchItemResult:
+        async with sem:
+            item.schema = schema_name
+            try:
+                doc = await asyncio.to_thread(_document_from_request, item)
+                res, usage, cost = await aext.extract(schema_name, model, doc.doc_id, doc.text)
+            except Exception as e:
+                log.warning("Batch item failed", extra={"component": "api", "event": "batch_item_error", "doc_id": item.doc_id, "schema": schema_name})
+                return BatchItemResult(index=index, ok=False, error=str(e))
+            return BatchItemResult(index=index, ok=True, result=_to_response(schema_name, res, usage, cost))
+
+    results = await asyncio.gather(*[_run(i, item) for i, item in enumerate(req.items)])
+    return BatchResponse(schema=schema_name, results=list(results))
+
+@app.post("/jobs", response_model=JobCreated, status_code=202)
+async def create_job(req: BatchRequest):
+    _init_once()
+    if req.schema not in SCHEMA_REGISTRY:
+        raise HTTPException(status_code=400, detail=f"Unknown schema: {req.schema}")
+    store, runner = _jobs()
+    pending = await asyncio.to_thread(store.pending_count)
+    if pending + len(req.items) > _state["s"].jobs_max_pending:
+        raise HTTPException(status_code=429, detail=f"Job queue is full ({pending} items pending)", headers={"Retry-After": "30"})
+    job_id = await asyncio.to_thread(store.create, req.schema, [item.model_dump() for item in req.items])
+    runner.notify()
+    return JobCreated(job_id=job_id, total=len(req.items))
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def job_status(job_id: str):
+    _init_once()
+    store, _ = _jobs()
+    st = await asyncio.to_thread(store.status, job_id)
+    if st is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return JobStatusResponse(
+        job_id=st.id, schema=st.schema, state=st.state, total=st.total,
+        pending=st.pending, running=st.running, done=st.done, failed=st.failed,
+    )
+
+@app.get("/jobs/{job_id}/results")
+async def job_results(job_id: str):
+    _init_once()
+    store, _ = _jobs()
+    if await asyncio.to_thread(store.status, job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+    async def _ndjson():
+        after = -1
+        while True:
+            page = await asyncio.to_thread(store.results_page, job_id, after)
+            if not page:
+                return
+            for row in page:
+                yield json.dumps(result_row(*row), ensure_ascii=False) + "\n"
+                after = row[0]
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
@@ -0,0 +1,123 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, Iterator, Optional, Set, Tuple
+import asyncio
+import glob
+import json
+import logging
+import time
+
+log = logging.getLogger("docintel.bulk")
+
+SUPPORTED_SUFFIXES = {".txt", ".md", ".pdf"}
+
+@dataclass(frozen=True)
+class BulkItem:
+    path: str
+    schema: str
+    doc_id: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.schema}:{self.doc_id or ''}:{self.path}"
+
+@dataclass
+class BulkStats:
+    ok: int = 0
+    failed: int = 0
+    skipped: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    elapsed_s: float = 0.0
+
+    @property
+    def docs_per_s(self) -> float:
+        return (self.ok + self.failed) / self.elapsed_s if self.elapsed_s else 0.0
+
+def iter_items(source: str, schema: str) -> Iterator[BulkItem]:
+    p = Path(source)
+    if p.is_dir():
+        for f in sorted(p.rglob("*")):
+            if f.is_file() and f.suffix.lower() in SUPPORTED_SUFFIXES:
+                yield BulkItem(path=str(f), schema=schema)
+    elif p.suffix.lower() == ".jsonl" and p.is_file():
+        with p.open(encoding="utf-8") as fh:
+            for n, line in enumerate(fh, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    log.warning("Malformed manifest line skipped", extra={"component": "bulk", "event": "manifest_skip", "doc_id": str(n)})
+                    continue
+                if not isinstance(row, dict) or not row.get("path"):
+                    log.warning("Manifest line without path skipped", extra={"component": "bulk", "event": "manifest_skip", "doc_id": str(n)})
+                    continue
+                # Relative paths are relative to the manifest, not to wherever the command runs.
+                yield BulkItem(path=str(p.parent / row["path"]), schema=row.get("schema") or schema, doc_id=row.get("doc_id"))
+    else:
+        for f in sorted(glob.glob(source, recursive=True)):
+            if Path(f).is_file():
+                yield BulkItem(path=f, schema=schema)
+
+def load_checkpoint(path: Path) -> Set[str]:
+    if not path.exists():
+        return set()
+    return {line.rstrip("\n") for line in path.open(encoding="utf-8") if line.strip()}
+
+ExtractOne = Callable[[BulkItem], Awaitable[Tuple[Any, Any, float]]]
+
+async def run_bulk(
+    items: Iterable[BulkItem],
+    extract_one: ExtractOne,
+    out_path: Path,
+    checkpoint_path: Path,
+    concurrency: int = 8,
+) -> BulkStats:
+    done = load_checkpoint(checkpoint_path)
+    stats = BulkStats()
+    it = iter(items)
+    t0 = time.perf_counter()
+
+    with out_path.open("a", encoding="utf-8") as out, checkpoint_path.open("a", encoding="utf-8") as ckpt:
+        async def _worker():
+            for item in it:
+                if item.key in done:
+                    stats.skipped += 1
+                    continue
+                row = {"path": item.path, "schema": item.schema, "doc_id": item.doc_id}
+                try:
+                    res, usage, cost = await extract_one(item)
+                except Exception as e:
+                    stats.failed += 1
+                    row.update({"ok": False, "error": str(e)})
+                    out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    out.flush()
+                    continue
+                stats.ok += 1
+                stats.prompt_tokens += usage.prompt_tokens
+                stats.completion_tokens += usage.completion_tokens
+                stats.cost_usd += cost
+                row.update({
+                    "ok": True,
+                    "doc_id": res.doc_id,
+                    "data": res.data,
+                    "confidence": res.confidence,
+                    "used_chunks": res.used_chunks,
+                    "prompt_tokens_est": usage.prompt_tokens,
+                    "completion_tokens_est": usage.completion_tokens,
+                    "cost_est_usd": cost,
+                })
+                # The result is flushed before its checkpoint line so a crash can only repeat work, never lose it.
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                out.flush()
+                ckpt.write(item.key + "\n")
+                ckpt.flush()
+                done.add(item.key)
+
+        await asyncio.gather(*[_worker() for _ in range(max(1, concurrency))])
+
+    stats.elapsed_s = time.perf_counter() - t0
+    return stats
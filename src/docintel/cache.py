@@ -1,22 +1,292 @@
 from __future__ import annotations
-from typing import Any, Callable, TypeVar
-from diskcache import Cache
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+import asyncio
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from diskcache import UNKNOWN, Cache, Disk
+from diskcache.core import DBNAME
+
+from docintel.telemetry import CACHE_LOOKUP_SECONDS
 
 T = TypeVar("T")
 
+_DISK_LOOKUP = CACHE_LOOKUP_SECONDS.labels("disk")
+_MEMORY_LOOKUP = CACHE_LOOKUP_SECONDS.labels("memory")
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Lookups are counted from executor threads as well as the loop.
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self) -> "CacheStats":
+        with self._lock:
+            return CacheStats(self.hits, self.misses)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+_ZLIB_MAGIC = b"\x00DIz"
+# Per-prefix lookup counters persist next to the cache so `cache stats` can read them from another
+# process. They live in their own never-evicting store, out of reach of cull() and the size limit.
+_STATS_DIR = "stats"
+_STATS_FLUSH_EVERY = 256
+_STATS_FLUSH_S = 30.0
+
+class CompressedDisk(Disk):
+    # Pickles and zlib-compresses values of at least `compress_min_bytes`. Entries written without
+    # compression (older caches, small values) are still read as before.
+    def __init__(self, directory, compress_level: int = 6, compress_min_bytes: int = 512, **kwargs):
+        super().__init__(directory, **kwargs)
+        self.compress_level = compress_level
+        self.compress_min_bytes = compress_min_bytes
+
+    def store(self, value, read, key=UNKNOWN):
+        if not read and self.compress_level > 0 and type(value) not in (int, float):
+            data = pickle.dumps(value, protocol=self.pickle_protocol)
+            if len(data) >= self.compress_min_bytes:
+                value = _ZLIB_MAGIC + zlib.compress(data, self.compress_level)
+        return super().store(value, read, key=key)
+
+    def fetch(self, mode, filename, value, read):
+        data = super().fetch(mode, filename, value, read)
+        if type(data) is bytes and data.startswith(_ZLIB_MAGIC):
+            return pickle.loads(zlib.decompress(data[len(_ZLIB_MAGIC):]))
+        return data
+
+def key_prefix(key: str) -> str:
+    return key.split(":", 1)[0] if ":" in key else ""
+
 class DiskCache:
-    def __init__(self, directory: str):
-        self._cache = Cache(directory)
+    def __init__(
+        self,
+        directory: str,
+        size_limit_bytes: int = 2**30,
+        eviction_policy: str = "least-recently-stored",
+        compress_level: int = 6,
+    ):
+        self._cache = Cache(
+            directory,
+            size_limit=size_limit_bytes,
+            eviction_policy=eviction_policy,
+            disk=CompressedDisk,
+            disk_compress_level=compress_level,
+        )
+        self._counters = Cache(str(Path(directory) / _STATS_DIR), eviction_policy="none")
+        self._stats = CacheStats()
+        self._lookups: Dict[Tuple[str, str], int] = {}
+        self._lookups_n = 0
+        self._lookups_flushed = time.monotonic()
+        self._lookups_lock = threading.Lock()
 
     def get(self, key: str) -> Any | None:
-        return self._cache.get(key, default=None)
+        with _DISK_LOOKUP.time("cache_disk"):
+            val = self._cache.get(key, default=None)
+        self._stats.record(val is not None)
+        self._count(key_prefix(key), "misses" if val is None else "hits")
+        return val
+
+    def _count(self, prefix: str, outcome: str) -> None:
+        with self._lookups_lock:
+            k = (prefix, outcome)
+            self._lookups[k] = self._lookups.get(k, 0) + 1
+            self._lookups_n += 1
+            due = self._lookups_n >= _STATS_FLUSH_EVERY or time.monotonic() - self._lookups_flushed > _STATS_FLUSH_S
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self) -> None:
+        with self._lookups_lock:
+            pending, self._lookups = self._lookups, {}
+            self._lookups_n = 0
+            self._lookups_flushed = time.monotonic()
+        for (prefix, outcome), n in pending.items():
+            self._counters.incr((prefix, outcome), n)
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        # Entries, stored bytes (after compression) and persisted hits/misses per key prefix.
+        self.flush_stats()
+        out: Dict[str, Dict[str, int]] = {}
+        # Sizes are only in the index; read it over a separate read-only connection.
+        db = sqlite3.connect(f"{Path(self._cache.directory, DBNAME).as_uri()}?mode=ro", uri=True)
+        try:
+            rows = db.execute(
+                "SELECT key, size + COALESCE(LENGTH(value), 0) FROM Cache WHERE expire_time IS NULL OR expire_time > ?",
+                (time.time(),),
+            ).fetchall()
+        finally:
+            db.close()
+        for key, size in rows:
+            if not isinstance(key, str):
+                continue
+            row = out.setdefault(key_prefix(key), {"entries": 0, "bytes": 0, "hits": 0, "misses": 0})
+            row["entries"] += 1
+            row["bytes"] += size
+        for prefix, outcome in self._counters:
+            row = out.setdefault(prefix, {"entries": 0, "bytes": 0, "hits": 0, "misses": 0})
+            row[outcome] = self._counters.get((prefix, outcome), default=0)
+        return out
+
+    def stats(self) -> Dict[str, CacheStats]:
+        return {"disk": self._stats.snapshot()}
+
+    def volume(self) -> int:
+        return self._cache.volume()
+
+    @property
+    def size_limit(self) -> int:
+        return self._cache.size_limit
+
+    @property
+    def eviction_policy(self) -> str:
+        return self._cache.eviction_policy
+
+    def prune(self, prefix: Optional[str] = None) -> int:
+        # Drops expired entries and evicts down to the size limit; with `prefix`, also every entry under it.
+        removed = self._cache.cull()
+        if prefix is not None:
+            for key in list(self._cache.iterkeys()):
+                if isinstance(key, str) and key_prefix(key) == prefix and self._cache.delete(key):
+                    removed += 1
+        return removed
 
     def set(self, key: str, value: Any, ttl_s: int | None = None) -> None:
         self._cache.set(key, value, expire=ttl_s)
 
+    def warm(self) -> None:
+        # Opens the SQLite connection and reads a page, without touching the hit/miss stats.
+        self._cache.get("__warm__", default=None)
+
+    async def aget(self, key: str) -> Any | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl_s: int | None = None) -> None:
+        await asyncio.to_thread(self.set, key, value, ttl_s)
+
     def close(self) -> None:
+        self.flush_stats()
+        self._counters.close()
         self._cache.close()
 
+class MemoryCache:
+    def __init__(self, max_items: int = 2048, ttl_s: int | None = 600):
+        self._max_items = max_items
+        self._ttl_s = ttl_s
+        self._data: OrderedDict[str, Tuple[float | None, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def get(self, key: str) -> Any | None:
+        with _MEMORY_LOOKUP.time("cache_memory"), self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, val = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self._stats.record(True)
+                    return val
+                del self._data[key]
+            self._stats.record(False)
+            return None
+
+    def stats(self) -> Dict[str, CacheStats]:
+        return {"memory": self._stats.snapshot()}
+
+    def set(self, key: str, value: Any, ttl_s: int | None = None) -> None:
+        ttls = [t for t in (ttl_s, self._ttl_s) if t is not None]
+        expires_at = time.monotonic() + min(ttls) if ttls else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_items:
+                self._data.popitem(last=False)
+
+class TieredCache:
+    def __init__(self, disk: DiskCache, memory: MemoryCache | None = None):
+        self.disk = disk
+        self.memory = memory or MemoryCache()
+
+    def get(self, key: str) -> Any | None:
+        val = self.memory.get(key)
+        if val is not None:
+            return val
+        val = self.disk.get(key)
+        if val is not None:
+            self.memory.set(key, val)
+        return val
+
+    def set(self, key: str, value: Any, ttl_s: int | None = None) -> None:
+        self.memory.set(key, value, ttl_s=ttl_s)
+        self.disk.set(key, value, ttl_s=ttl_s)
+
+    async def aget(self, key: str) -> Any | None:
+        val = self.memory.get(key)
+        if val is not None:
+            return val
+        val = await self.disk.aget(key)
+        if val is not None:
+            self.memory.set(key, val)
+        return val
+
+    async def aset(self, key: str, value: Any, ttl_s: int | None = None) -> None:
+        self.memory.set(key, value, ttl_s=ttl_s)
+        await self.disk.aset(key, value, ttl_s=ttl_s)
+
+    def warm(self) -> None:
+        self.disk.warm()
+
+    def stats(self) -> Dict[str, CacheStats]:
+        return {**self.memory.stats(), **self.disk.stats()}
+
+    def close(self) -> None:
+        self.disk.close()
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+def build_disk_cache(settings) -> DiskCache:
+    settings.cache_dir.mkdir(parents=True, exist_ok=True)
+    return DiskCache(
+        str(settings.cache_dir),
+        size_limit_bytes=settings.cache_size_limit_mb * 2**20,
+        eviction_policy=settings.cache_eviction_policy,
+        compress_level=settings.cache_compress_level,
+    )
+
 def cached_call(cache: DiskCache, key: str, fn: Callable[[], T], ttl_s: int | None) -> T:
     hit = cache.get(key)
     if hit is not None:
@@ -1,63 +1,167 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import List
+from typing import Callable, Iterator, List, Tuple
 import regex as re
 
+# Same boundaries as splitting on r"\n\n+|(?<=[.!?])\s+", but without the lookbehind, which the
+# engine would otherwise evaluate at every position; the punctuation stays with the preceding part.
+_SPLIT_RE = re.compile(r"\n\n+|[.!?]\s+")
+
+# Normalised prose runs about four characters per token; a chunk estimated at twice that density
+# and still over the remaining budget is skipped without being tokenised.
+_MAX_CHARS_PER_TOKEN = 8
+
 @dataclass(frozen=True)
 class Chunk:
     doc_id: str
     chunk_id: int
     text: str
+    start: int = 0
+    end: int = 0
 
-def chunk_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
-    if chunk_overlap >= chunk_size:
-        raise ValueError("chunk_overlap must be < chunk_size")
+def _strip_span(text: str, a: int, b: int) -> Tuple[int, int]:
+    while a < b and text[a].isspace():
+        a += 1
+    while b > a and text[b - 1].isspace():
+        b -= 1
+    return a, b
 
-    parts = re.split(r"\n\n+|(?<=[.!?])\s+", text)
-    parts = [p.strip() for p in parts if p and p.strip()]
+def _iter_parts(text: str) -> Iterator[Tuple[int, int]]:
+    pos = 0
+    for m in _SPLIT_RE.finditer(text):
+        sep_start, sep_end = m.span()
+        a, b = pos, sep_start if text[sep_start] == "\n" else sep_start + 1
+        pos = sep_end
+        if a < b and (text[a].isspace() or text[b - 1].isspace()):
+            a, b = _strip_span(text, a, b)
+        if a < b:
+            yield a, b
+    a, b = _strip_span(text, pos, len(text))
+    if a < b:
+        yield a, b
 
-    chunks: List[str] = []
-    cur: List[str] = []
-    cur_len = 0
+def _coalesce(text: str, spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    # Neighbouring spans separated by exactly one space in the source read the same as one slice.
+    out = [spans[0]]
+    for a, b in spans[1:]:
+        pa, pb = out[-1]
+        if a == pb + 1 and text[pb] == " ":
+            out[-1] = (pa, b)
+        else:
+            out.append((a, b))
+    return out
 
-    def flush():
-        nonlocal cur, cur_len
-        if cur:
-            chunks.append(" ".join(cur).strip())
-            cur = []
-            cur_len = 0
+def _join_spans(text: str, spans: List[Tuple[int, int]]) -> str:
+    if len(spans) == 1:
+        a, b = spans[0]
+        return text[a:b]
+    return " ".join(text[a:b] for a, b in spans)
 
-    for part in parts:
-        plen = len(part)
-        if cur_len + plen + 1 <= chunk_size:
-            cur.append(part)
-            cur_len += plen + 1
-            continue
+def _tail(spans: List[Tuple[int, int]], n: int) -> List[Tuple[int, int]]:
+    # Spans for the last n characters of the spans joined with single spaces. A tail that would start
+    # on a joining space drops it; the chunk is stripped anyway.
+    out: List[Tuple[int, int]] = []
+    for a, b in reversed(spans):
+        if b - a >= n:
+            out.append((b - n, b))
+            break
+        out.append((a, b))
+        n -= b - a + 1
+        if n <= 0:
+            break
+    return out[::-1]
+
+def iter_chunks(text: str, chunk_size: int, chunk_overlap: int, doc_id: str = "") -> Iterator[Chunk]:
+    # Output is identical to the eager implementation it replaced (benchmarks/bench_chunking.py),
+    # including the overlapping tail pieces it emits at the end of an oversized part.
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be < chunk_size")
 
-        flush()
+    def _base() -> Iterator[List[Tuple[int, int]]]:
+        cur: List[Tuple[int, int]] = []
+        cur_len = 0
+        for a, b in _iter_parts(text):
+            plen = b - a
+            if cur_len + plen + 1 <= chunk_size:
+                cur.append((a, b))
+                cur_len += plen + 1
+                continue
 
-        if plen > chunk_size:
-            start = 0
-            while start < plen:
-                end = min(start + chunk_size, plen)
-                chunks.append(part[start:end].strip())
-                start = max(end - chunk_overlap, start + 1)
-        else:
-            cur.append(part)
-            cur_len = plen + 1
+            if cur:
+                yield _coalesce(text, cur)
+                cur = []
+                cur_len = 0
 
-    flush()
+            if plen > chunk_size:
+                start = 0
+                while start < plen:
+                    end = min(start + chunk_size, plen)
+                    yield [_strip_span(text, a + start, a + end)]
+                    start = max(end - chunk_overlap, start + 1)
+            else:
+                cur.append((a, b))
+                cur_len = plen + 1
+
+        if cur:
+            yield _coalesce(text, cur)
 
-    if chunk_overlap > 0 and len(chunks) > 1:
-        overlapped: List[str] = []
-        prev_tail = ""
-        for c in chunks:
-            overlapped.append((prev_tail + " " + c).strip() if prev_tail else c)
-            prev_tail = c[-chunk_overlap:]
-        chunks = overlapped
+    chunk_id = 0
+    prev_tail: List[Tuple[int, int]] = []
+    for body in _base():
+        # The overlap is the previous body's tail, taken by offset; in running prose it is contiguous
+        # with the body and the whole chunk is a single slice of the source.
+        spans = _coalesce(text, prev_tail + body) if prev_tail and prev_tail[-1][0] < prev_tail[-1][1] else body
+        out = _join_spans(text, spans)
+        if out[:1].isspace() or out[-1:].isspace():
+            out = out.strip()
+        if chunk_overlap > 0:
+            prev_tail = _tail(body, chunk_overlap)
+        if out:
+            yield Chunk(doc_id=doc_id, chunk_id=chunk_id, text=out, start=body[0][0], end=body[-1][1])
+            chunk_id += 1
 
-    return [c for c in chunks if c.strip()]
+def chunk_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    return [c.text for c in iter_chunks(text, chunk_size, chunk_overlap)]
 
 def build_chunks(doc_id: str, text: str, chunk_size: int, chunk_overlap: int) -> List[Chunk]:
-    chunks = chunk_text(text, chunk_size, chunk_overlap)
-    return [Chunk(doc_id=doc_id, chunk_id=i, text=c) for i, c in enumerate(chunks)]
+    return list(iter_chunks(text, chunk_size, chunk_overlap, doc_id=doc_id))
+
+def pack_chunks(
+    chunks: List[Chunk],
+    count: Callable[[str], int],
+    budget: int,
+    per_chunk_overhead: int = 8,
+    prefix: bool = False,
+) -> List[Chunk]:
+    # prefix=True keeps document order: packing stops at the first chunk that does not fit.
+    picked: List[Chunk] = []
+    used = 0
+    for c in chunks:
+        left = budget - used - per_chunk_overhead
+        # Every chunk costs at least the overhead, so nothing further can fit; stop counting.
+        if left < 0:
+            break
+        n = None if len(c.text) // _MAX_CHARS_PER_TOKEN > left else count(c.text)
+        if n is None or n > left:
+            if prefix:
+                break
+            continue
+        picked.append(c)
+        used += n + per_chunk_overhead
+    return sorted(picked, key=lambda c: c.chunk_id)
+
+def pack_windows(chunks: List[Chunk], count: Callable[[str], int], budget: int, per_chunk_overhead: int = 8) -> List[List[Chunk]]:
+    windows: List[List[Chunk]] = []
+    cur: List[Chunk] = []
+    used = 0
+    for c in chunks:
+        n = count(c.text) + per_chunk_overhead
+        if cur and used + n > budget:
+            windows.append(cur)
+            cur = []
+            used = 0
+        cur.append(c)
+        used += n
+    if cur:
+        windows.append(cur)
+    return windows
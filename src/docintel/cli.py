@@ -1,63 +1,237 @@
 from __future__ import annotations
 from pathlib import Path
+from typing import Optional
+import asyncio
 import json
+import logging
 import typer
 from rich import print
-from openai import OpenAI
-
-from docintel.config import get_settings
-from docintel.logging import configure_logging
-from docintel.tracing import configure_tracing, TracingConfig
-from docintel.cache import DiskCache
-from docintel.ingest import load_document
-from docintel.schemas import SCHEMA_REGISTRY
-from docintel.llm import LLMClient
-from docintel.extractor import SchemaExtractor
-from docintel.eval import load_golden, run_eval
+
+# Heavy dependencies (openai, tiktoken, pypdf, OpenTelemetry, pydantic-settings) are imported inside the
+# commands that need them, so `--help` and argument errors do not pay for them.
+
+log = logging.getLogger("docintel.cli")
 
 app = typer.Typer(add_completion=False)
+cache_app = typer.Typer(add_completion=False, help="Inspect and maintain the on-disk cache.")
+app.add_typer(cache_app, name="cache")
 
 def build_sync_extractor():
+    from docintel.cache import build_disk_cache
+    from docintel.config import get_settings
+    from docintel.extractor import SchemaExtractor
+    from docintel.llm import LLMClient, build_openai_client
+    from docintel.logging import configure_logging
+    from docintel.ratelimit import SharedTokenBucket, build_limiter
+    from docintel.tracing import TracingConfig, configure_tracing
+
+    s = get_settings()
+    configure_logging()
+    configure_tracing(TracingConfig(service_name=s.service_name, otlp_endpoint=s.otlp_endpoint))
+    cache = None
+    if s.enable_cache:
+        cache = build_disk_cache(s)
+    client = build_openai_client(s)
+    limiter = build_limiter(s)
+    llm = LLMClient(
+        client, s.llm_model, cache, s.llm_cache_ttl_s, s.max_retries, s.request_timeout_s,
+        limiter=limiter if isinstance(limiter, SharedTokenBucket) else None,
+    )
+    extractor = SchemaExtractor(llm, s, cache=cache)
+    return s, extractor, cache
+
+def build_async_extractor():
+    from docintel.cache import MemoryCache, TieredCache, build_disk_cache
+    from docintel.concurrency import build_concurrency, build_hedging
+    from docintel.config import get_settings
+    from docintel.extractor import AsyncSchemaExtractor
+    from docintel.llm import AsyncLLMClient, build_async_openai_client
+    from docintel.logging import configure_logging
+    from docintel.ratelimit import build_limiter, build_token_budget
+    from docintel.tracing import TracingConfig, configure_tracing
+
     s = get_settings()
     configure_logging()
     configure_tracing(TracingConfig(service_name=s.service_name, otlp_endpoint=s.otlp_endpoint))
     cache = None
     if s.enable_cache:
-        s.cache_dir.mkdir(parents=True, exist_ok=True)
-        cache = DiskCache(str(s.cache_dir))
-    client = OpenAI()
-    llm = LLMClient(client, s.llm_model, cache, s.llm_cache_ttl_s, s.max_retries, s.request_timeout_s)
-    extractor = SchemaExtractor(llm, s)
-    return s, extractor
+        cache = TieredCache(build_disk_cache(s), MemoryCache(s.memory_cache_max_items, s.memory_cache_ttl_s))
+    limiter = build_limiter(s)
+    concurrency = build_concurrency(s)
+    aclient = build_async_openai_client(s, sdk_retries=concurrency is None)
+    allm = AsyncLLMClient(
+        aclient, s.llm_model, cache, s.llm_cache_ttl_s, s.max_retries, s.request_timeout_s,
+        limiter=limiter, concurrency=concurrency, budget=build_token_budget(s), hedging=build_hedging(s),
+    )
+    return s, AsyncSchemaExtractor(allm, s, cache=cache), cache
 
 @app.command()
 def extract(path: str, schema: str = typer.Option("contract")):
+    from docintel.ingest import load_document
+    from docintel.schemas import SCHEMA_REGISTRY
+
     p = Path(path)
-    s, ext = build_sync_extractor()
-    doc = load_document(p)
-    model = SCHEMA_REGISTRY.get(schema)
-    if not model:
-        raise typer.BadParameter(f"Unknown schema: {schema}")
-    res = ext.extract_sync(schema, model, doc.doc_id, doc.text)
+    s, ext, cache = build_sync_extractor()
+    try:
+        doc = load_document(p, cache=cache, pdf_workers=s.pdf_workers)
+        model = SCHEMA_REGISTRY.get(schema)
+        if not model:
+            raise typer.BadParameter(f"Unknown schema: {schema}")
+        res = ext.extract_sync(schema, model, doc.doc_id, doc.text)
+    finally:
+        if cache:
+            cache.close()
     print(json.dumps(res.data, indent=2, ensure_ascii=False))
 
+@app.command("extract-many")
+def extract_many(
+    source: str = typer.Argument(..., help="Directory, glob pattern or JSONL manifest with a 'path' per line"),
+    schema: str = typer.Option("contract"),
+    out: Path = typer.Option(Path("results.jsonl"), help="JSONL output, appended as documents finish"),
+    checkpoint: Optional[Path] = typer.Option(None, help="Completed-document log used to resume (default: <out>.ckpt)"),
+    concurrency: int = typer.Option(8, min=1, max=256),
+):
+    from docintel.bulk import BulkItem, iter_items, run_bulk
+    from docintel.ingest import load_document
+    from docintel.schemas import SCHEMA_REGISTRY
+
+    if schema not in SCHEMA_REGISTRY:
+        raise typer.BadParameter(f"Unknown schema: {schema}")
+    s, aext, cache = build_async_extractor()
+    ckpt = checkpoint or out.with_name(out.name + ".ckpt")
+
+    async def _extract_one(item: "BulkItem"):
+        model = SCHEMA_REGISTRY.get(item.schema)
+        if not model:
+            raise ValueError(f"Unknown schema: {item.schema}")
+        doc = await asyncio.to_thread(load_document, Path(item.path), item.doc_id, cache, s.pdf_workers)
+        return await aext.extract(item.schema, model, doc.doc_id, doc.text)
+
+    try:
+        stats = asyncio.run(run_bulk(iter_items(source, schema), _extract_one, out, ckpt, concurrency=concurrency))
+    finally:
+        if cache:
+            cache.close()
+    print(f"[bold]{stats.ok}[/bold] ok, [red]{stats.failed}[/red] failed, {stats.skipped} skipped (checkpoint) in {stats.elapsed_s:.1f}s")
+    print(f"throughput: {stats.docs_per_s:.2f} docs/s")
+    print(f"tokens: {stats.prompt_tokens} prompt + {stats.completion_tokens} completion = {stats.prompt_tokens + stats.completion_tokens}")
+    print(f"estimated cost: ${stats.cost_usd:.4f}")
+
 @app.command()
 def eval(golden_path: str = "eval/golden.json"):
-    s, ext = build_sync_extractor()
+    from docintel.eval import load_golden, run_eval
+    from docintel.ingest import load_document
+    from docintel.schemas import SCHEMA_REGISTRY
+
+    s, ext, cache = build_sync_extractor()
     cases = load_golden(Path(golden_path))
 
     def _extract(schema_name: str, doc_path: Path):
-        doc = load_document(doc_path)
+        doc = load_document(doc_path, cache=cache, pdf_workers=s.pdf_workers)
         model = SCHEMA_REGISTRY[schema_name]
         res = ext.extract_sync(schema_name, model, doc.doc_id, doc.text)
         return res.data
 
-    results = run_eval(_extract, cases)
+    try:
+        results = run_eval(_extract, cases)
+    finally:
+        if cache:
+            cache.close()
     passed = sum(1 for r in results if r.passed)
     print(f"[bold]{passed}/{len(results)}[/bold] cases passed")
     for r in results:
         status = "[green]PASS[/green]" if r.passed else "[red]FAIL[/red]"
         print(f"{status} {r.schema} {r.doc_path}")
+    rep = ext.repairs
+    print(f"Repair calls: {rep.field_repairs} field-level, {rep.full_repairs} full over {rep.calls} completions ({rep.repair_call_rate:.0%})")
+
+def _open_cache():
+    from docintel.cache import build_disk_cache
+    from docintel.config import get_settings
+    return build_disk_cache(get_settings())
+
+def _size(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(n) < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+@cache_app.command("stats")
+def cache_stats(as_json: bool = typer.Option(False, "--json", help="Print one JSON object instead of a table")):
+    cache = _open_cache()
+    try:
+        usage, volume, limit, policy = cache.usage(), cache.volume(), cache.size_limit, cache.eviction_policy
+    finally:
+        cache.close()
+    if as_json:
+        typer.echo(json.dumps({"volume_bytes": volume, "size_limit_bytes": limit, "eviction_policy": policy, "prefixes": usage}))
+        return
+    print(f"[bold]{_size(volume)}[/bold] of {_size(limit)} ({policy})")
+    print(f"{'prefix':<16}{'entries':>9}{'bytes':>12}{'hits':>9}{'misses':>9}{'hit ratio':>11}")
+    for prefix, row in sorted(usage.items()):
+        lookups = row["hits"] + row["misses"]
+        ratio = f"{row['hits'] / lookups:.0%}" if lookups else "-"
+        print(f"{prefix or '(none)':<16}{row['entries']:>9}{_size(row['bytes']):>12}{row['hits']:>9}{row['misses']:>9}{ratio:>11}")
+
+@cache_app.command("prune")
+def cache_prune(prefix: Optional[str] = typer.Option(None, help="Also delete every entry under this key prefix, e.g. chat")):
+    cache = _open_cache()
+    try:
+        before = cache.volume()
+        removed = cache.prune(prefix)
+        after = cache.volume()
+    finally:
+        cache.close()
+    print(f"removed {removed} entries; {_size(before)} -> {_size(after)}")
+
+@cache_app.command("warm")
+def cache_warm(
+    source: str = typer.Option(..., "--from", help="JSONL manifest with a 'path' per line (or a directory / glob)"),
+    schema: str = typer.Option("contract"),
+    concurrency: int = typer.Option(8, min=1, max=256),
+):
+    from docintel.bulk import iter_items
+    from docintel.ingest import load_document
+    from docintel.schemas import SCHEMA_REGISTRY
+
+    s, aext, cache = build_async_extractor()
+    if cache is None:
+        raise typer.BadParameter("Caching is disabled (DI_ENABLE_CACHE=false)")
+    items = iter(iter_items(source, schema))
+    counts = {"ok": 0, "failed": 0}
+
+    async def _worker():
+        # Workers share one iterator, so a large manifest is never materialised.
+        for item in items:
+            try:
+                model = SCHEMA_REGISTRY.get(item.schema)
+                if not model:
+                    raise ValueError(f"Unknown schema: {item.schema}")
+                doc = await asyncio.to_thread(load_document, Path(item.path), item.doc_id, cache, s.pdf_workers)
+                await aext.extract(item.schema, model, doc.doc_id, doc.text)
+                counts["ok"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                log.warning(
+                    "Cache warm failed for %s: %s", item.path, e, exc_info=True,
+                    extra={"component": "cli", "event": "cache_warm_error", "doc_id": item.doc_id or item.path, "schema": item.schema},
+                )
+
+    async def _run():
+        await asyncio.gather(*(_worker() for _ in range(concurrency)))
+
+    try:
+        before = cache.disk.usage()
+        asyncio.run(_run())
+        after = cache.disk.usage()
+    finally:
+        cache.close()
+    print(f"[bold]{counts['ok']}[/bold] documents warmed, [red]{counts['failed']}[/red] failed")
+    for prefix, row in sorted(after.items()):
+        added = row["entries"] - before.get(prefix, {}).get("entries", 0)
+        if added:
+            print(f"  {prefix}: +{added} entries ({_size(row['bytes'])} total)")
 
 if __name__ == "__main__":
     app()
@@ -0,0 +1,244 @@
+from __future__ import annotations
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+import asyncio
+import logging
+import sys
+import time
+
+log = logging.getLogger("docintel.concurrency")
+
+T = TypeVar("T")
+
+_OVERLOAD_STATUS = (429, 503)
+
+def retry_after_s(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return max(0.0, float(ms) / 1000)
+        except ValueError:
+            pass
+    val = headers.get("retry-after")
+    if not val:
+        return None
+    try:
+        return max(0.0, float(val))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(val).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_overload(exc: BaseException) -> bool:
+    if isinstance(exc, TimeoutError):
+        return True
+    # Looked up rather than imported: if openai raised this, it is already loaded.
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(exc, (openai.APITimeoutError, openai.RateLimitError)):
+        return True
+    return getattr(exc, "status_code", None) in _OVERLOAD_STATUS
+
+def is_transient(exc: BaseException) -> bool:
+    # Worth another attempt: overload, server errors and dropped connections. Bad requests, auth
+    # and validation errors would fail the same way again.
+    if is_overload(exc) or isinstance(exc, ConnectionError):
+        return True
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(exc, openai.APIConnectionError):
+        return True
+    status = getattr(exc, "status_code", None)
+    return isinstance(status, int) and status >= 500
+
+class AdaptiveConcurrency:
+    # AIMD: +1 slot per limit's worth of healthy responses, multiplicative cut on 429/503/timeout.
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        backoff: float = 0.5,
+        latency_target_s: Optional[float] = None,
+    ):
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._min = min_limit
+        self._max = max_limit
+        self._backoff = backoff
+        self._latency_target_s = latency_target_s
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._paused_until = 0.0
+        self._last_cut = 0.0
+        self.throttled = 0
+        self.cuts = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "throttled": self.throttled,
+            "cuts": self.cuts,
+            "paused_s": max(0.0, self._paused_until - time.monotonic()),
+        }
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self._acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_overload(e):
+                self._on_overload(started, retry_after_s(e))
+            raise
+        else:
+            self._on_success(time.monotonic() - started)
+        finally:
+            self._in_flight -= 1
+            self._wake()
+
+    async def _acquire(self) -> None:
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if self._in_flight < self.limit:
+                self._in_flight += 1
+                return
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    # We were woken but will not take the slot; hand the wakeup on.
+                    self._wake()
+                raise
+
+    def _wake(self) -> None:
+        free = self.limit - self._in_flight
+        while free > 0 and self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+    def _on_success(self, latency_s: float) -> None:
+        if self._latency_target_s is not None and latency_s > self._latency_target_s:
+            return
+        self._limit = min(float(self._max), self._limit + 1.0 / self._limit)
+
+    def _on_overload(self, started: float, retry_after: Optional[float]) -> None:
+        now = time.monotonic()
+        self.throttled += 1
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        # Requests already in flight when we cut report the same congestion; cut once per episode.
+        if started < self._last_cut:
+            return
+        self._limit = max(float(self._min), self._limit * self._backoff)
+        self._last_cut = now
+        self.cuts += 1
+        log.warning(
+            "LLM concurrency reduced to %d", self.limit,
+            extra={"component": "llm", "event": "concurrency_cut"},
+        )
+
+class HedgePolicy:
+    # Fire a duplicate request once a call outlives the `percentile` of recent latencies,
+    # spending at most `budget` extra requests per primary call.
+    def __init__(self, percentile: float = 0.95, budget: float = 0.05, min_samples: int = 20, window: int = 512, burst: float = 5.0):
+        self._percentile = percentile
+        self._budget = budget
+        self._min_samples = min_samples
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._burst = burst
+        # Credits are only earned by calls, so a zero budget never hedges.
+        self._credits = 0.0
+        self.calls = 0
+        self.fired = 0
+        self.won = 0
+
+    def record(self, latency_s: float) -> None:
+        self._latencies.append(latency_s)
+
+    def delay(self) -> Optional[float]:
+        if len(self._latencies) < self._min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self._percentile * len(ordered)))]
+
+    def start_call(self) -> None:
+        self.calls += 1
+        self._credits = min(self._burst, self._credits + self._budget)
+
+    def try_hedge(self) -> bool:
+        if self._credits < 1.0:
+            return False
+        self._credits -= 1.0
+        self.fired += 1
+        return True
+
+    def snapshot(self) -> Dict[str, float]:
+        return {"calls": self.calls, "fired": self.fired, "won": self.won, "delay_s": self.delay() or 0.0}
+
+async def hedged(policy: HedgePolicy, call: Callable[[], Awaitable[T]]) -> Tuple[T, int]:
+    async def _timed() -> T:
+        t0 = time.monotonic()
+        out = await call()
+        policy.record(time.monotonic() - t0)
+        return out
+
+    policy.start_call()
+    delay = policy.delay()
+    primary = asyncio.ensure_future(_timed())
+    tasks = [primary]
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and policy.try_hedge():
+                tasks.append(asyncio.ensure_future(_timed()))
+        pending = set(tasks)
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    if t is not primary:
+                        policy.won += 1
+                    return t.result(), len(tasks) - 1
+                error = t.exception()
+        raise error
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+
+def build_hedging(settings) -> Optional[HedgePolicy]:
+    if settings.hedge_percentile is None:
+        return None
+    return HedgePolicy(percentile=settings.hedge_percentile, budget=settings.hedge_budget)
+
+def build_concurrency(settings) -> Optional[AdaptiveConcurrency]:
+    if not settings.adaptive_concurrency:
+        return None
+    return AdaptiveConcurrency(
+        initial=settings.llm_concurrency_initial,
+        max_limit=settings.llm_concurrency_max,
+        latency_target_s=settings.llm_latency_target_s,
+    )
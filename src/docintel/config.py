@@ -1,5 +1,6 @@
 from __future__ import annotations
 from pathlib import Path
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
@@ -10,20 +11,58 @@ class DISettings(BaseSettings):
     cache_dir: Path = Field(default=Path(".di_cache"))
 
     llm_model: str = Field(default="gpt-4o-mini")
+    llm_backend: Literal["openai", "stub"] = Field(default="openai")
     request_timeout_s: float = Field(default=45.0, ge=5.0, le=180.0)
     max_retries: int = Field(default=6, ge=0, le=10)
 
     chunk_size: int = Field(default=1200, ge=200, le=6000)
     chunk_overlap: int = Field(default=200, ge=0, le=2000)
+    max_chunks_per_call: int = Field(default=6, ge=1, le=64)
+    chunk_selection: Literal["first", "bm25"] = Field(default="first")
+    prompt_token_budget: Optional[int] = Field(default=None, ge=500, le=1_000_000)
+
+    extraction_mode: Literal["first_chunks", "map_reduce"] = Field(default="first_chunks")
+    map_concurrency: int = Field(default=4, ge=1, le=32)
 
     enable_cache: bool = Field(default=True)
     extraction_cache_ttl_s: int = Field(default=60 * 60 * 24 * 14)
     llm_cache_ttl_s: int = Field(default=60 * 60 * 24 * 7)
+    memory_cache_max_items: int = Field(default=2048, ge=1)
+    memory_cache_ttl_s: int = Field(default=60 * 10, ge=1)
+    cache_size_limit_mb: int = Field(default=1024, ge=1)
+    cache_eviction_policy: Literal["least-recently-stored", "least-recently-used", "least-frequently-used", "none"] = Field(default="least-recently-stored")
+    cache_compress_level: int = Field(default=6, ge=0, le=9)
 
     otlp_endpoint: str | None = Field(default=None)
     service_name: str = Field(default="doc-intel-reference")
 
+    pdf_workers: int = Field(default=0, ge=0, le=64)
+
+    warmup: bool = Field(default=True)
+    profile_sample_rate: float = Field(default=0.0, ge=0.0, le=1.0)
+    profile_dir: Optional[Path] = Field(default=None)
+
+    stub_latency_ms: float = Field(default=200.0, ge=0.0)
+    stub_latency_sigma: float = Field(default=0.5, ge=0.0)
+    stub_error_rate: float = Field(default=0.0, ge=0.0, le=1.0)
+    stub_throttle_rate: float = Field(default=0.0, ge=0.0, le=1.0)
+    stub_seed: int = Field(default=0)
+
     max_rps: float = Field(default=3.0, ge=0.0, le=100.0)
+    rate_limiter: Literal["local", "shared"] = Field(default="local")
+    rpm_limit: int = Field(default=0, ge=0)
+    tpm_limit: int = Field(default=0, ge=0)
+    expected_completion_tokens: int = Field(default=512, ge=1)
+    adaptive_concurrency: bool = Field(default=False)
+    llm_concurrency_initial: int = Field(default=4, ge=1, le=256)
+    llm_concurrency_max: int = Field(default=32, ge=1, le=256)
+    llm_latency_target_s: Optional[float] = Field(default=None, gt=0.0)
+    hedge_percentile: Optional[float] = Field(default=None, ge=0.5, lt=1.0)
+    hedge_budget: float = Field(default=0.05, ge=0.0, le=1.0)
+    batch_concurrency: int = Field(default=8, ge=1, le=64)
+    jobs_concurrency: int = Field(default=4, ge=1, le=64)
+    jobs_max_pending: int = Field(default=10_000, ge=1)
+    jobs_lease_s: float = Field(default=60.0, gt=0.0)
 
 def get_settings() -> DISettings:
     return DISettings()
@@ -1,13 +1,22 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Any, Dict, Type
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+import asyncio
 import logging
+import threading
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
-from docintel.chunking import build_chunks
-from docintel.postprocess import extract_json_object, coerce_common_fields
-from docintel.prompts import build_extraction_messages
+from docintel.cache import DiskCache, TieredCache
+from docintel.chunking import Chunk, build_chunks, pack_chunks, pack_windows
+from docintel.hashing import sha256_json, sha256_text
+from docintel.metrics import Usage, get_estimator
+from docintel.postprocess import IncrementalFields, extract_json_object, coerce_common_fields, merge_partials
+from docintel.prompts import build_extraction_messages, build_field_repair_messages
+from docintel.retrieval import rank_chunks
+from docintel.telemetry import stage
 from docintel.tracing import get_tracer
 
 log = logging.getLogger("docintel.extractor")
@@ -21,72 +30,350 @@ class ExtractionResult:
     confidence: float
     used_chunks: int
 
+@dataclass
+class RepairStats:
+    calls: int = 0
+    field_repairs: int = 0
+    full_repairs: int = 0
+    # The sync map-reduce path counts from its window threads.
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @property
+    def repair_call_rate(self) -> float:
+        return (self.field_repairs + self.full_repairs) / self.calls if self.calls else 0.0
+
 def _validate(schema_model: Type[BaseModel], obj: Dict[str, Any]) -> Dict[str, Any]:
-    obj = coerce_common_fields(obj)
-    model = schema_model.model_validate(obj)
-    return model.model_dump()
+    with stage("validation"):
+        obj = coerce_common_fields(obj)
+        model = schema_model.model_validate(obj)
+        return model.model_dump()
+
+@lru_cache(maxsize=None)
+def schema_version(schema_model: Type[BaseModel]) -> str:
+    return sha256_json(schema_model.model_json_schema())[:16]
+
+def result_cache_key(settings, schema_name: str, schema_model: Type[BaseModel], text: str) -> str:
+    parts = {
+        "schema": schema_name,
+        "schema_version": schema_version(schema_model),
+        "text": sha256_text(text),
+        "chunk_size": settings.chunk_size,
+        "chunk_overlap": settings.chunk_overlap,
+        "max_chunks": settings.max_chunks_per_call,
+        "selection": settings.chunk_selection,
+        "token_budget": settings.prompt_token_budget,
+        "mode": settings.extraction_mode,
+        "model": settings.llm_model,
+        # Bumped when the stored entry shape changes, so stale entries miss instead of failing to unpack.
+        "layout": 3,
+    }
+    return f"extract:{sha256_json(parts)}"
+
+def window_cache_key(settings, schema_name: str, schema_model: Type[BaseModel], payload_text: str) -> str:
+    parts = {
+        "schema": schema_name,
+        "schema_version": schema_version(schema_model),
+        "window": sha256_text(payload_text),
+        "model": settings.llm_model,
+        "layout": 3,
+    }
+    return f"extract_window:{sha256_json(parts)}"
+
+_CHUNK_HINT = "Chunks are labeled. Use them to ground extracted facts."
+_REPAIR_MSG = {"role":"user","content":"Your previous output was invalid. Return ONLY corrected JSON matching the schema."}
+
+def _parse(raw: str) -> Optional[Dict[str, Any]]:
+    try:
+        return _json(raw)
+    except ValueError:
+        return None
+
+def _json(raw: str) -> Dict[str, Any]:
+    with stage("json_parse"):
+        return extract_json_object(raw)
+
+def _messages(schema_model: Type[BaseModel], chunks: List[Chunk], doc_id: str) -> List[Dict[str, str]]:
+    with stage("prompt_build"):
+        return build_extraction_messages(schema_model, _payload_text(chunks), doc_id, chunk_hint=_CHUNK_HINT)
+
+def _chunk_plan(settings, schema_model: Type[BaseModel], doc_id: str, text: str) -> List[List[Chunk]]:
+    with stage("chunking"):
+        chunks = build_chunks(doc_id, text, settings.chunk_size, settings.chunk_overlap)
+        return _plan(settings, schema_model, doc_id, chunks)
+
+def _failing_fields(schema_model: Type[BaseModel], obj: Dict[str, Any], err: ValidationError) -> Dict[str, Dict[str, Any]]:
+    fields: Dict[str, Dict[str, Any]] = {}
+    for e in err.errors():
+        name = e["loc"][0] if e["loc"] else None
+        if name not in schema_model.model_fields:
+            # Not attributable to one field; only a full re-ask can help.
+            return {}
+        fields.setdefault(name, {"value": obj.get(name), "error": e["msg"]})
+    return fields
+
+def _patched(obj: Dict[str, Any], raw: str, fields: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    fixed = _parse(raw) or {}
+    return {**obj, **{k: fixed.get(k) for k in fields}}
+
+def _add_usage(a: Usage, b: Usage) -> Usage:
+    return Usage(
+        prompt_tokens=a.prompt_tokens + b.prompt_tokens,
+        completion_tokens=a.completion_tokens + b.completion_tokens,
+        hedged_requests=a.hedged_requests + b.hedged_requests,
+    )
+
+# Cache hits report no usage and no cost, whichever extractor wrote the entry: usage is what this
+# request spent upstream, the same rule the spend metrics follow. Entries therefore hold only the result.
+
+def _result_entry(res: ExtractionResult) -> Dict[str, Any]:
+    return res.__dict__
+
+def _load_result(hit, doc_id: str) -> Tuple[ExtractionResult, Usage, float]:
+    return replace(ExtractionResult(**hit), doc_id=doc_id), Usage(), 0.0
+
+def _window_entry(data: Dict[str, Any], confidence: float) -> Tuple[Dict[str, Any], float]:
+    return data, confidence
+
+def _load_window(hit) -> Tuple[Dict[str, Any], float, Usage, float]:
+    data, confidence = hit
+    return data, confidence, Usage(), 0.0
+
+def _payload_text(chunks: List[Chunk]) -> str:
+    return "\n\n".join([f"[chunk {c.chunk_id}] {c.text}" for c in chunks])
+
+def _chunk_budget(settings, schema_model: Type[BaseModel], doc_id: str) -> Optional[int]:
+    if settings.prompt_token_budget is None:
+        return None
+    est = get_estimator(settings.llm_model)
+    shell = build_extraction_messages(schema_model, "", doc_id, chunk_hint=_CHUNK_HINT)
+    overhead = sum(est.count_cached(m["content"]) + 8 for m in shell)
+    return max(settings.prompt_token_budget - overhead, 0)
+
+def _plan(settings, schema_model: Type[BaseModel], doc_id: str, chunks: List[Chunk]) -> List[List[Chunk]]:
+    size = settings.max_chunks_per_call
+    budget = _chunk_budget(settings, schema_model, doc_id)
+    count = get_estimator(settings.llm_model).count_cached if budget is not None else None
+    if settings.extraction_mode == "map_reduce":
+        windows = _windows(chunks, size) if count is None else pack_windows(chunks, count, budget)
+        if len(windows) > 1:
+            return windows
+    candidates = rank_chunks(chunks, schema_model) if settings.chunk_selection == "bm25" else chunks
+    if count is None:
+        return [sorted(candidates[:size], key=lambda c: c.chunk_id)]
+    # A single chunk larger than the budget is still sent rather than an empty document.
+    return [pack_chunks(candidates, count, budget, prefix=settings.chunk_selection == "first") or candidates[:1]]
+
+def _windows(chunks: List[Chunk], size: int) -> List[List[Chunk]]:
+    return [chunks[i:i + size] for i in range(0, len(chunks), size)]
 
 class SchemaExtractor:
-    def __init__(self, llm_client, settings):
+    def __init__(self, llm_client, settings, cache: Optional[DiskCache] = None):
         self._llm = llm_client
         self._s = settings
+        self._cache = cache
+        self.repairs = RepairStats()
 
     def extract_sync(self, schema_name: str, schema_model: Type[BaseModel], doc_id: str, text: str) -> ExtractionResult:
-        chunks = build_chunks(doc_id, text, self._s.chunk_size, self._s.chunk_overlap)
-        used = min(len(chunks), 6)
-        selected = chunks[:used]
-        payload_text = "\n\n".join([f"[chunk {c.chunk_id}] {c.text}" for c in selected])
+        if not self._cache:
+            return self._extract_sync(schema_name, schema_model, doc_id, text)
+        key = result_cache_key(self._s, schema_name, schema_model, text)
+        hit = self._cache.get(key)
+        if hit is not None:
+            return _load_result(hit, doc_id)[0]
+        res = self._extract_sync(schema_name, schema_model, doc_id, text)
+        self._cache.set(key, _result_entry(res), ttl_s=self._s.extraction_cache_ttl_s)
+        return res
+
+    def _extract_sync(self, schema_name: str, schema_model: Type[BaseModel], doc_id: str, text: str) -> ExtractionResult:
+        windows = _chunk_plan(self._s, schema_model, doc_id, text)
+        used = sum(len(w) for w in windows)
 
         with tracer.start_as_current_span("extract_sync") as span:
             span.set_attribute("schema", schema_name)
             span.set_attribute("doc_id", doc_id)
             span.set_attribute("chunks_used", used)
 
-            messages = build_extraction_messages(schema_model, payload_text, doc_id, chunk_hint="Chunks are labeled. Use them to ground extracted facts.")
-            raw = self._llm.complete(messages)
+            if len(windows) == 1:
+                data, confidence = self._complete_validated(schema_name, schema_model, doc_id, windows[0])
+                return ExtractionResult(schema=schema_name, doc_id=doc_id, data=data, confidence=confidence, used_chunks=used)
+
+            span.set_attribute("windows", len(windows))
+            with ThreadPoolExecutor(max_workers=self._s.map_concurrency) as pool:
+                futures = [pool.submit(self._window_sync, schema_name, schema_model, doc_id, w) for w in windows]
+                parts = [f.result() for f in futures]
+            data = _validate(schema_model, merge_partials(schema_model, [d for d, _ in parts]))
+            return ExtractionResult(schema=schema_name, doc_id=doc_id, data=data, confidence=min(c for _, c in parts), used_chunks=used)
+
+    def _window_sync(self, schema_name: str, schema_model: Type[BaseModel], doc_id: str, window: List[Chunk]) -> Tuple[Dict[str, Any], float]:
+        key = window_cache_key(self._s, schema_name, schema_model, _payload_text(window))
+        if self._cache:
+            hit = self._cache.get(key)
+            if hit is not None:
+                return _load_window(hit)[:2]
+        data, confidence = self._complete_validated(schema_name, schema_model, doc_id, window)
+        if self._cache:
+            self._cache.set(key, _window_entry(data, confidence), ttl_s=self._s.extraction_cache_ttl_s)
+        return data, confidence
+
+    def _complete_validated(self, schema_name: str, schema_model: Type[BaseModel], doc_id: str, chunks: List[Chunk]) -> Tuple[Dict[str, Any], float]:
+        messages = _messages(schema_model, chunks, doc_id)
+        raw = self._llm.complete(messages)
+        self.repairs.record("calls")
 
+        obj = _parse(raw)
+        if obj is not None:
             try:
-                obj = extract_json_object(raw)
-                data = _validate(schema_model, obj)
-                return ExtractionResult(schema=schema_name, doc_id=doc_id, data=data, confidence=0.85, used_chunks=used)
-            except Exception:
-                log.warning("Invalid JSON; requesting corrected output", extra={"component":"extractor","event":"repair","doc_id":doc_id,"schema":schema_name})
-                fix_messages = messages + [{"role":"user","content":"Your previous output was invalid. Return ONLY corrected JSON matching the schema."}]
-                raw2 = self._llm.complete(fix_messages)
-                obj2 = extract_json_object(raw2)
-                data2 = _validate(schema_model, obj2)
-                return ExtractionResult(schema=schema_name, doc_id=doc_id, data=data2, confidence=0.75, used_chunks=used)
+                return _validate(schema_model, obj), 0.85
+            except ValidationError as e:
+                fields = _failing_fields(schema_model, obj, e)
+            if fields:
+                log.warning("Invalid fields; re-asking them only", extra={"component":"extractor","event":"field_repair","doc_id":doc_id,"schema":schema_name})
+                self.repairs.record("field_repairs")
+                raw_fields = self._llm.complete(build_field_repair_messages(schema_model, fields))
+                try:
+                    return _validate(schema_model, _patched(obj, raw_fields, fields)), 0.8
+                except ValidationError:
+                    pass
+
+        log.warning("Invalid JSON; requesting corrected output", extra={"component":"extractor","event":"repair","doc_id":doc_id,"schema":schema_name})
+        self.repairs.record("full_repairs")
+        raw2 = self._llm.complete(messages + [_REPAIR_MSG])
+        obj2 = _json(raw2)
+        return _validate(schema_model, obj2), 0.75
 
 class AsyncSchemaExtractor:
-    def __init__(self, async_llm_client, settings):
+    def __init__(self, async_llm_client, settings, cache: Optional[DiskCache | TieredCache] = None):
         self._llm = async_llm_client
         self._s = settings
+        self.repairs = RepairStats()
+        self._cache = cache
 
     async def extract(self, schema_name: str, schema_model: Type[BaseModel], doc_id: str, text: str):
-        chunks = build_chunks(doc_id, text, self._s.chunk_size, self._s.chunk_overlap)
-        used = min(len(chunks), 6)
-        selected = chunks[:used]
-        payload_text = "\n\n".join([f"[chunk {c.chunk_id}] {c.text}" for c in selected])
+        if not self._cache:
+            return await self._extract(schema_name, schema_model, doc_id, text)
+        key = result_cache_key(self._s, schema_name, schema_model, text)
+        hit = await self._cache.aget(key)
+        if hit is not None:
+            return _load_result(hit, doc_id)
+        res, usage, cost = await self._extract(schema_name, schema_model, doc_id, text)
+        await self._cache.aset(key, _result_entry(res), ttl_s=self._s.extraction_cache_ttl_s)
+        return res, usage, cost
+
+    async def _extract(self, schema_name: str, schema_model: Type[BaseModel], doc_id: str, text: str):
+        windows = await asyncio.to_thread(_chunk_plan, self._s, schema_model, doc_id, text)
+        used = sum(len(w) for w in windows)
 
         with tracer.start_as_current_span("extract_async") as span:
             span.set_attribute("schema", schema_name)
             span.set_attribute("doc_id", doc_id)
             span.set_attribute("chunks_used", used)
 
-            messages = build_extraction_messages(schema_model, payload_text, doc_id, chunk_hint="Chunks are labeled. Use them to ground extracted facts.")
-            raw, usage, cost = await self._llm.complete(messages)
+            if len(windows) == 1:
+                data, confidence, usage, cost = await self._complete_validated(schema_name, schema_model, doc_id, windows[0])
+                res = ExtractionResult(schema=schema_name, doc_id=doc_id, data=data, confidence=confidence, used_chunks=used)
+                return res, usage, cost
+
+            span.set_attribute("windows", len(windows))
+            sem = asyncio.Semaphore(self._s.map_concurrency)
+
+            async def _bounded(window: List[Chunk]):
+                async with sem:
+                    return await self._window(schema_name, schema_model, doc_id, window)
 
+            parts = await asyncio.gather(*[_bounded(w) for w in windows], return_exceptions=True)
+            for p in parts:
+                if isinstance(p, BaseException):
+                    raise p
+            data = _validate(schema_model, merge_partials(schema_model, [p[0] for p in parts]))
+            usage = Usage(
+                prompt_tokens=sum(p[2].prompt_tokens for p in parts),
+                completion_tokens=sum(p[2].completion_tokens for p in parts),
+                hedged_requests=sum(p[2].hedged_requests for p in parts),
+            )
+            res = ExtractionResult(schema=schema_name, doc_id=doc_id, data=data, confidence=min(p[1] for p in parts), used_chunks=used)
+            return res, usage, sum(p[3] for p in parts)
+
+    async def _window(self, schema_name: str, schema_model: Type[BaseModel], doc_id: str, window: List[Chunk]):
+        key = window_cache_key(self._s, schema_name, schema_model, _payload_text(window))
+        if self._cache:
+            hit = await self._cache.aget(key)
+            if hit is not None:
+                return _load_window(hit)
+        data, confidence, usage, cost = await self._complete_validated(schema_name, schema_model, doc_id, window)
+        if self._cache:
+            await self._cache.aset(key, _window_entry(data, confidence), ttl_s=self._s.extraction_cache_ttl_s)
+        return data, confidence, usage, cost
+
+    async def extract_stream(self, schema_name: str, schema_model: Type[BaseModel], doc_id: str, text: str) -> AsyncIterator[Tuple[str, Any]]:
+        # Yields ("field", (name, value)) as soon as each member of the model's JSON is complete,
+        # then ("result", (res, usage, cost)) once the whole object is validated.
+        key = result_cache_key(self._s, schema_name, schema_model, text) if self._cache else None
+        hit = await self._cache.aget(key) if self._cache else None
+        if hit is not None:
+            res, usage, cost = _load_result(hit, doc_id)
+            for item in res.data.items():
+                yield "field", item
+            yield "result", (res, usage, cost)
+            return
+
+        windows = await asyncio.to_thread(_chunk_plan, self._s, schema_model, doc_id, text)
+        if len(windows) != 1:
+            # Map-reduce fields only exist after the merge; nothing to stream early.
+            res, usage, cost = await self.extract(schema_name, schema_model, doc_id, text)
+            for item in res.data.items():
+                yield "field", item
+            yield "result", (res, usage, cost)
+            return
+
+        messages = _messages(schema_model, windows[0], doc_id)
+        fields = IncrementalFields()
+        parts: List[str] = []
+        async for delta, final_usage, final_cost in self._llm.stream(messages):
+            if final_usage is not None:
+                usage, cost = final_usage, final_cost
+                continue
+            parts.append(delta)
+            for name, value in fields.feed(delta):
+                if name in schema_model.model_fields:
+                    yield "field", (name, value)
+
+        data, confidence, usage, cost = await self._finish_validated(schema_name, schema_model, doc_id, messages, "".join(parts), usage, cost)
+        res = ExtractionResult(schema=schema_name, doc_id=doc_id, data=data, confidence=confidence, used_chunks=len(windows[0]))
+        if self._cache:
+            await self._cache.aset(key, _result_entry(res), ttl_s=self._s.extraction_cache_ttl_s)
+        yield "result", (res, usage, cost)
+
+    async def _complete_validated(self, schema_name: str, schema_model: Type[BaseModel], doc_id: str, chunks: List[Chunk]):
+        messages = _messages(schema_model, chunks, doc_id)
+        raw, usage, cost = await self._llm.complete(messages)
+        return await self._finish_validated(schema_name, schema_model, doc_id, messages, raw, usage, cost)
+
+    async def _finish_validated(self, schema_name: str, schema_model: Type[BaseModel], doc_id: str, messages, raw: str, usage: Usage, cost: float):
+        self.repairs.record("calls")
+
+        obj = _parse(raw)
+        if obj is not None:
             try:
-                obj = extract_json_object(raw)
-                data = _validate(schema_model, obj)
-                res = ExtractionResult(schema=schema_name, doc_id=doc_id, data=data, confidence=0.85, used_chunks=used)
-                return res, usage, cost
-            except Exception:
-                fix_messages = messages + [{"role":"user","content":"Your previous output was invalid. Return ONLY corrected JSON matching the schema."}]
-                raw2, usage2, cost2 = await self._llm.complete(fix_messages)
-                obj2 = extract_json_object(raw2)
-                data2 = _validate(schema_model, obj2)
-                res2 = ExtractionResult(schema=schema_name, doc_id=doc_id, data=data2, confidence=0.75, used_chunks=used)
-                usage2.prompt_tokens += usage.prompt_tokens
-                usage2.completion_tokens += usage.completion_tokens
-                return res2, usage2, cost + cost2
+                return _validate(schema_model, obj), 0.85, usage, cost
+            except ValidationError as e:
+                fields = _failing_fields(schema_model, obj, e)
+            if fields:
+                log.warning("Invalid fields; re-asking them only", extra={"component":"extractor","event":"field_repair","doc_id":doc_id,"schema":schema_name})
+                self.repairs.record("field_repairs")
+                raw_fields, usage_f, cost_f = await self._llm.complete(build_field_repair_messages(schema_model, fields))
+                usage, cost = _add_usage(usage, usage_f), cost + cost_f
+                try:
+                    return _validate(schema_model, _patched(obj, raw_fields, fields)), 0.8, usage, cost
+                except ValidationError:
+                    pass
+
+        log.warning("Invalid JSON; requesting corrected output", extra={"component":"extractor","event":"repair","doc_id":doc_id,"schema":schema_name})
+        self.repairs.record("full_repairs")
+        raw2, usage2, cost2 = await self._llm.complete(messages + [_REPAIR_MSG])
+        obj2 = _json(raw2)
+        data2 = _validate(schema_model, obj2)
+        return data2, 0.75, _add_usage(usage, usage2), cost + cost2
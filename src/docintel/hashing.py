@@ -1,7 +1,7 @@
 from __future__ import annotations
 import hashlib
 import json
-from typing import Any
+from typing import Any, Dict, List
 
 def sha256_text(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -9,3 +9,13 @@ def sha256_text(text: str) -> str:
 def sha256_json(obj: Any) -> str:
     data = json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
     return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def sha256_messages(model: str, messages: List[Dict[str, Any]]) -> str:
+    # Hashes length-prefixed message fields directly instead of re-serializing (and re-escaping) them as JSON.
+    h = hashlib.sha256(model.encode("utf-8"))
+    for m in messages:
+        for field in (str(m.get("role", "")), str(m.get("content", ""))):
+            data = field.encode("utf-8")
+            h.update(len(data).to_bytes(8, "little"))
+            h.update(data)
+    return h.hexdigest()
@@ -1,9 +1,18 @@
 from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Any, BinaryIO, Deque, Dict, Iterator, List, Optional, Tuple
+import hashlib
+import multiprocessing
+import os
 import re
-from pypdf import PdfReader
+import tempfile
+import threading
+
+from docintel.telemetry import stage
 
 @dataclass(frozen=True)
 class Document:
@@ -20,23 +29,218 @@ def normalize_text(text: str) -> str:
 def read_text(path: Path) -> str:
     return normalize_text(path.read_text(encoding="utf-8", errors="ignore"))
 
-def read_pdf(path: Path) -> str:
-    reader = PdfReader(str(path))
-    pages = []
-    for p in reader.pages:
-        try:
-            pages.append(p.extract_text() or "")
-        except Exception:
-            pages.append("")
+def spool_upload(stream: BinaryIO, directory: Path, suffix: str = "") -> Path:
+    # A private file per call: concurrent uploads of the same bytes never share (or delete) each other's spool.
+    directory.mkdir(parents=True, exist_ok=True)
+    stream.seek(0)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=suffix, delete=False) as tmp:
+        for block in iter(lambda: stream.read(1 << 20), b""):
+            tmp.write(block)
+    stream.seek(0)
+    return Path(tmp.name)
+
+def _extract_page(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+def _extract_page_range(path: str, indices: List[int]) -> List[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [_extract_page(reader.pages[i]) for i in indices]
+
+def _digest(obj, memo: Dict[Tuple[int, int], str]) -> str:
+    # Stable hash of a PDF object with indirect references resolved. Shared objects (fonts, CMaps) are
+    # hashed once per document; image data cannot change extracted text and is skipped.
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref not in memo:
+            memo[ref] = "cycle"
+            memo[ref] = _digest(obj.get_object(), memo)
+        return memo[ref]
+    h = hashlib.sha256()
+    if isinstance(obj, DictionaryObject):
+        for k, v in sorted(obj.items()):
+            if k != "/Parent":
+                h.update(f"{k}=".encode())
+                h.update(_digest(v, memo).encode())
+        if isinstance(obj, StreamObject) and obj.get("/Subtype") != "/Image":
+            h.update(obj.get_data())
+    elif isinstance(obj, ArrayObject):
+        for v in obj:
+            h.update(_digest(v, memo).encode())
+    else:
+        h.update(f"{type(obj).__name__}:{obj}".encode())
+    return h.hexdigest()
+
+def _page_cache_key(page, memo: Dict[Tuple[int, int], str]) -> Optional[str]:
+    # Keyed on the page's content stream plus everything extraction reads through its resources (fonts,
+    # encodings, ToUnicode maps, form XObjects), so an amended PDF only re-extracts pages that changed
+    # and identical streams drawn with different fonts do not share an entry.
+    from pypdf import __version__ as pypdf_version
+    try:
+        contents = page.get_contents()
+        h = hashlib.sha256(contents.get_data() if contents is not None else b"")
+        h.update(_digest(page.get("/Resources"), memo).encode())
+        h.update(f"rotate={page.get('/Rotate', 0)};pypdf={pypdf_version}".encode())
+    except Exception:
+        return None
+    return f"pdfpage:{h.hexdigest()}"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def _pdf_pool(workers: int) -> ProcessPoolExecutor:
+    # One long-lived pool per process, shared by every document. Spawned rather than forked: the
+    # callers are to_thread workers of a process that runs an event loop and other threads.
+    global _pool, _pool_workers
+    n = workers or os.cpu_count() or 1
+    with _pool_lock:
+        if _pool is None or _pool_workers != n:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = n
+        return _pool
+
+def _drop_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+def shutdown_pdf_pool() -> None:
+    with _pool_lock:
+        pool = _pool
+    if pool is not None:
+        _drop_pdf_pool(pool)
+
+def iter_pdf_pages(
+    source: Path | BinaryIO,
+    cache: Any | None = None,
+    workers: int = 0,
+    pages_per_task: int = 8,
+    ttl_s: int | None = None,
+    spool_dir: Path | None = None,
+) -> Iterator[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(str(source) if isinstance(source, Path) else source)
+    pages = reader.pages
+    memo: Dict[Tuple[int, int], str] = {}
+
+    def _lookup(start: int) -> Tuple[range, Dict[int, Optional[str]], Dict[int, str]]:
+        # Keys are computed one batch at a time, so the first pages are out before the last are hashed.
+        batch = range(start, min(start + pages_per_task, len(pages)))
+        keys = {i: _page_cache_key(pages[i], memo) for i in batch}
+        texts: Dict[int, str] = {}
+        if cache:
+            for i, key in keys.items():
+                if key is not None:
+                    hit = cache.get(key)
+                    if hit is not None:
+                        texts[i] = hit
+        return batch, keys, texts
+
+    def _store(keys: Dict[int, Optional[str]], i: int, text: str) -> str:
+        if cache and keys[i] is not None:
+            cache.set(keys[i], text, ttl_s=ttl_s)
+        return text
+
+    starts = range(0, len(pages), pages_per_task)
+    path = source if isinstance(source, Path) else None
+    if workers == 1 or len(starts) <= 1 or (path is None and spool_dir is None):
+        for start in starts:
+            batch, keys, texts = _lookup(start)
+            for i in batch:
+                yield texts[i] if i in texts else _store(keys, i, _extract_page(pages[i]))
+        return
+
+    # Enough batches are kept in flight to occupy every worker while earlier pages are consumed.
+    depth = 2 * (workers or os.cpu_count() or 1)
+    todo = iter(starts)
+    ahead: Deque[Tuple[range, Dict[int, Optional[str]], Dict[int, str], List[int], Optional[Future]]] = deque()
+    pool: Optional[ProcessPoolExecutor] = None
+    spooled = False
+
+    def _submit() -> bool:
+        nonlocal path, pool, spooled
+        start = next(todo, None)
+        if start is None:
+            return False
+        batch, keys, texts = _lookup(start)
+        missing = [i for i in batch if i not in texts]
+        fut = None
+        if missing:
+            if path is None:
+                # Pool workers open the PDF themselves, so an in-memory upload is spooled for the duration of this read.
+                path, spooled = spool_upload(source, spool_dir, ".pdf"), True
+            pool = pool or _pdf_pool(workers)
+            fut = pool.submit(_extract_page_range, str(path), missing)
+        ahead.append((batch, keys, texts, missing, fut))
+        return True
+
+    try:
+        while len(ahead) < depth and _submit():
+            pass
+        while ahead:
+            batch, keys, texts, missing, fut = ahead.popleft()
+            if fut is not None:
+                for i, text in zip(missing, fut.result()):
+                    texts[i] = _store(keys, i, text)
+            _submit()
+            for i in batch:
+                yield texts[i]
+    except BrokenProcessPool:
+        # A crashed worker poisons the pool; the next document starts a fresh one.
+        _drop_pdf_pool(pool)
+        raise
+    finally:
+        for *_, fut in ahead:
+            if fut is not None:
+                fut.cancel()
+        if spooled:
+            path.unlink(missing_ok=True)
+
+def read_pdf(
+    source: Path | BinaryIO,
+    cache: Any | None = None,
+    workers: int = 0,
+    pages_per_task: int = 8,
+    spool_dir: Path | None = None,
+) -> str:
+    pages = iter_pdf_pages(source, cache=cache, workers=workers, pages_per_task=pages_per_task, spool_dir=spool_dir)
     return normalize_text("\n".join(pages))
 
-def load_document(path: Path, doc_id: Optional[str] = None) -> Document:
+def load_document(path: Path, doc_id: Optional[str] = None, cache: Any | None = None, pdf_workers: int = 0) -> Document:
     suffix = path.suffix.lower()
-    if suffix in {".txt", ".md"}:
-        txt = read_text(path)
-    elif suffix == ".pdf":
-        txt = read_pdf(path)
-    else:
-        raise ValueError(f"Unsupported file type: {suffix}")
+    with stage("ingest"):
+        if suffix in {".txt", ".md"}:
+            txt = read_text(path)
+        elif suffix == ".pdf":
+            txt = read_pdf(path, cache=cache, workers=pdf_workers)
+        else:
+            raise ValueError(f"Unsupported file type: {suffix}")
     did = doc_id or path.name
     return Document(doc_id=did, source_path=str(path), text=txt)
+
+def load_document_stream(
+    stream: BinaryIO,
+    filename: str,
+    doc_id: Optional[str] = None,
+    cache: Any | None = None,
+    pdf_workers: int = 0,
+    spool_dir: Path | None = None,
+) -> Document:
+    suffix = Path(filename).suffix.lower()
+    with stage("ingest"):
+        if suffix in {".txt", ".md"}:
+            txt = normalize_text(stream.read().decode("utf-8", errors="ignore"))
+        elif suffix == ".pdf":
+            txt = read_pdf(stream, cache=cache, workers=pdf_workers, spool_dir=spool_dir)
+        else:
+            raise ValueError(f"Unsupported file type: {suffix}")
+    return Document(doc_id=doc_id or filename, source_path=f"upload:{filename}", text=txt)
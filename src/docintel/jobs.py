@@ -0,0 +1,225 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+log = logging.getLogger("docintel.jobs")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    schema TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    lease_until REAL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status);
+"""
+
+@dataclass(frozen=True)
+class JobStatus:
+    id: str
+    schema: str
+    total: int
+    pending: int
+    running: int
+    done: int
+    failed: int
+
+    @property
+    def state(self) -> str:
+        if self.done + self.failed == self.total:
+            return "completed"
+        return "running" if self.running or self.done or self.failed else "queued"
+
+class JobStore:
+    # Every process (API worker) opens its own store and claims items under its own owner id with a
+    # lease. Leases are renewed while work is in progress; an item whose lease ran out belongs to a
+    # process that died and can be claimed by any other.
+    def __init__(self, path: Path, lease_s: float = 60.0, owner: Optional[str] = None):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(items)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE items ADD COLUMN {column} {kind}")
+        self._lock = threading.Lock()
+        self.lease_s = lease_s
+        self.owner = owner or uuid.uuid4().hex
+
+    def create(self, schema: str, requests: List[Dict[str, Any]]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("INSERT INTO jobs VALUES (?, ?, ?, ?)", (job_id, schema, len(requests), time.time()))
+            self._conn.executemany(
+                "INSERT INTO items (job_id, idx, status, request) VALUES (?, ?, 'pending', ?)",
+                [(job_id, i, json.dumps(r, ensure_ascii=False)) for i, r in enumerate(requests)],
+            )
+            self._conn.execute("COMMIT")
+        return job_id
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM items WHERE status IN ('pending', 'running')").fetchone()[0]
+
+    def requeue_expired(self) -> int:
+        # Items from before leases existed have none and count as expired.
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE items SET status = 'pending', owner = NULL, lease_until = NULL "
+                "WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)",
+                (time.time(),),
+            ).rowcount
+
+    def claim(self) -> Optional[Tuple[str, int, str, Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE items SET status = 'running', owner = ?, lease_until = ? WHERE rowid = "
+                "(SELECT items.rowid FROM items JOIN jobs ON jobs.id = items.job_id "
+                "WHERE items.status = 'pending' OR (items.status = 'running' AND (items.lease_until IS NULL OR items.lease_until < ?)) "
+                "ORDER BY jobs.created_at, items.idx LIMIT 1) "
+                "RETURNING job_id, idx, request",
+                (self.owner, now + self.lease_s, now),
+            ).fetchone()
+            if row is None:
+                return None
+            schema = self._conn.execute("SELECT schema FROM jobs WHERE id = ?", (row[0],)).fetchone()[0]
+        return row[0], row[1], schema, json.loads(row[2])
+
+    def renew(self) -> int:
+        # Heartbeat: extends the lease on every item this store is still working on.
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE items SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + self.lease_s, self.owner),
+            ).rowcount
+
+    def finish(self, job_id: str, idx: int, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> bool:
+        # False when the lease was lost and another process has the item now; its outcome wins.
+        status = "error" if error is not None else "done"
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE items SET status = ?, result = ?, error = ?, owner = NULL, lease_until = NULL "
+                "WHERE job_id = ? AND idx = ? AND status = 'running' AND owner = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, job_id, idx, self.owner),
+            ).rowcount == 1
+
+    def status(self, job_id: str) -> Optional[JobStatus]:
+        with self._lock:
+            job = self._conn.execute("SELECT schema, total FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM items WHERE job_id = ? GROUP BY status", (job_id,)).fetchall())
+        return JobStatus(
+            id=job_id,
+            schema=job[0],
+            total=job[1],
+            pending=counts.get("pending", 0),
+            running=counts.get("running", 0),
+            done=counts.get("done", 0),
+            failed=counts.get("error", 0),
+        )
+
+    def results_page(self, job_id: str, after_idx: int, limit: int = 200) -> List[Tuple[int, str, Optional[str], Optional[str]]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT idx, status, result, error FROM items WHERE job_id = ? AND idx > ? "
+                "AND status IN ('done', 'error') ORDER BY idx LIMIT ?",
+                (job_id, after_idx, limit),
+            ).fetchall()
+
+    def close(self) -> None:
+        self._conn.close()
+
+def result_row(idx: int, status: str, result: Optional[str], error: Optional[str]) -> Dict[str, Any]:
+    if status == "done":
+        return {"index": idx, "ok": True, "result": json.loads(result)}
+    return {"index": idx, "ok": False, "error": error}
+
+ProcessItem = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+class JobRunner:
+    def __init__(self, store: JobStore, process: ProcessItem, concurrency: int = 4):
+        self._store = store
+        self._process = process
+        self._concurrency = concurrency
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        # Only items whose owner stopped renewing its lease are picked up again; other live
+        # processes sharing the database keep theirs.
+        requeued = self._store.requeue_expired()
+        if requeued:
+            log.info("Requeued interrupted job items", extra={"component": "jobs", "event": "requeue"})
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._concurrency)]
+        self._heartbeat = asyncio.create_task(self._renew())
+        self._wakeup.set()
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        tasks = self._tasks + ([self._heartbeat] if self._heartbeat else [])
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._heartbeat = None
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(self._store.lease_s / 3)
+            try:
+                await asyncio.to_thread(self._store.renew)
+            except sqlite3.Error:
+                log.warning("Job lease renewal failed", extra={"component": "jobs", "event": "lease_renew_error"}, exc_info=True)
+
+    async def _worker(self) -> None:
+        while True:
+            claimed = await asyncio.to_thread(self._store.claim)
+            if claimed is None:
+                # Also wakes up once per lease period to take over items a dead process left behind.
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._store.lease_s)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            job_id, idx, schema, request = claimed
+            try:
+                result, error = await self._process(schema, request), None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result, error = None, str(e)
+            if not await asyncio.to_thread(self._store.finish, job_id, idx, result, error):
+                log.warning("Job item lease lost; outcome discarded", extra={"component": "jobs", "event": "lease_lost", "doc_id": f"{job_id}:{idx}"})
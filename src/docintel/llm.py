@@ -1,39 +1,91 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional, Tuple
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
 import logging
 
-from openai import OpenAI, AsyncOpenAI
-from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception
 from aiolimiter import AsyncLimiter
 
-from docintel.cache import DiskCache
-from docintel.hashing import sha256_json
+from docintel.concurrency import AdaptiveConcurrency, HedgePolicy, hedged, is_transient, retry_after_s
+from docintel.cache import DiskCache, SingleFlight, TieredCache
+from docintel.hashing import sha256_messages
 from docintel.tracing import get_tracer
-from docintel.metrics import Usage, TokenEstimator, CostModel
+from docintel.ratelimit import SharedTokenBucket, TokenBudget
+from docintel.metrics import Usage, CostModel, get_estimator
+from docintel.telemetry import LLM_COST_USD, LLM_TOKENS, note_retry, stage
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
 
 log = logging.getLogger("docintel.llm")
 tracer = get_tracer("docintel.llm")
 
+def _wait_retry_after(fallback):
+    # A server-sent Retry-After beats our own backoff guess.
+    def _wait(retry_state) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        hint = retry_after_s(exc) if exc is not None else None
+        return hint if hint is not None else fallback(retry_state)
+    return _wait
+
+def _count_retry(retry_state) -> None:
+    note_retry()
+
+def build_openai_client(settings) -> OpenAI:
+    if settings.llm_backend == "stub":
+        from docintel.stub import StubOpenAI, stub_config
+        return StubOpenAI(stub_config(settings))
+    from openai import OpenAI
+    return OpenAI()
+
+def build_async_openai_client(settings, sdk_retries: bool = True) -> AsyncOpenAI:
+    if settings.llm_backend == "stub":
+        from docintel.stub import StubAsyncOpenAI, stub_config
+        return StubAsyncOpenAI(stub_config(settings))
+    from openai import AsyncOpenAI
+    return AsyncOpenAI() if sdk_retries else AsyncOpenAI(max_retries=0)
+
+def _tokens_used_on_failure(exc: BaseException, reserved: int) -> int:
+    # Only a 429 is turned away before the model sees the prompt. Timeouts and other failures may
+    # have been processed and billed, so the reservation stands.
+    return 0 if getattr(exc, "status_code", None) == 429 else reserved
+
+def _record_spend(usage: Usage, cost: CostModel) -> None:
+    # Cache hits are not spend; only completions that actually went upstream are counted.
+    LLM_TOKENS.labels("in").inc(usage.prompt_tokens)
+    LLM_TOKENS.labels("out").inc(usage.completion_tokens)
+    LLM_COST_USD.inc(cost.estimate(usage).total_usd)
+
 class LLMClient:
-    def __init__(self, client: OpenAI, model: str, cache: DiskCache | None, ttl_s: int | None, max_retries: int, timeout_s: float):
+    def __init__(
+        self,
+        client: OpenAI,
+        model: str,
+        cache: DiskCache | None,
+        ttl_s: int | None,
+        max_retries: int,
+        timeout_s: float,
+        limiter: Optional[SharedTokenBucket] = None,
+    ):
         self._client = client
         self._model = model
         self._cache = cache
         self._ttl_s = ttl_s
         self._max_retries = max_retries
         self._timeout_s = timeout_s
+        self._limiter = limiter
 
     def _retry(self):
         return retry(
             reraise=True,
             stop=stop_after_attempt(self._max_retries if self._max_retries > 0 else 1),
-            wait=wait_exponential_jitter(initial=0.8, max=30),
-            retry=retry_if_exception_type(Exception),
+            wait=_wait_retry_after(wait_exponential_jitter(initial=0.8, max=30)),
+            retry=retry_if_exception(is_transient),
+            before_sleep=_count_retry,
         )
 
     def complete(self, messages: List[Dict[str, Any]]) -> str:
-        payload = {"model": self._model, "messages": messages}
-        key = f"chat:{sha256_json(payload)}"
+        key = f"chat:{sha256_messages(self._model, messages)}"
 
         def _call():
             return self._complete_uncached(messages)
@@ -50,15 +102,18 @@ class LLMClient:
     def _complete_uncached(self, messages: List[Dict[str, Any]]) -> str:
         with tracer.start_as_current_span("chat.completions.create") as span:
             span.set_attribute("model", self._model)
+            if self._limiter:
+                self._limiter.acquire_sync()
 
             @self._retry()
             def _do():
-                resp = self._client.chat.completions.create(
-                    model=self._model,
-                    messages=messages,
-                    temperature=0.0,
-                    timeout=self._timeout_s,
-                )
+                with stage("llm"):
+                    resp = self._client.chat.completions.create(
+                        model=self._model,
+                        messages=messages,
+                        temperature=0.0,
+                        timeout=self._timeout_s,
+                    )
                 return resp.choices[0].message.content or ""
 
             return _do()
@@ -68,11 +123,14 @@ class AsyncLLMClient:
         self,
         client: AsyncOpenAI,
         model: str,
-        cache: DiskCache | None,
+        cache: DiskCache | TieredCache | None,
         ttl_s: int | None,
         max_retries: int,
         timeout_s: float,
-        limiter: Optional[AsyncLimiter] = None,
+        limiter: Optional[AsyncLimiter | SharedTokenBucket] = None,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+        budget: Optional[TokenBudget] = None,
+        hedging: Optional[HedgePolicy] = None,
     ):
         self._client = client
         self._model = model
@@ -81,30 +139,38 @@ class AsyncLLMClient:
         self._max_retries = max_retries
         self._timeout_s = timeout_s
         self._limiter = limiter
-        self._est = TokenEstimator(model)
+        self.concurrency = concurrency
+        self._budget = budget
+        self.hedging = hedging
+        self._flight = SingleFlight()
+        self._est = get_estimator(model)
         self._cost = CostModel(model)
 
     def _retry(self):
         return retry(
             reraise=True,
             stop=stop_after_attempt(self._max_retries if self._max_retries > 0 else 1),
-            wait=wait_exponential_jitter(initial=0.8, max=30),
-            retry=retry_if_exception_type(Exception),
+            wait=_wait_retry_after(wait_exponential_jitter(initial=0.8, max=30)),
+            retry=retry_if_exception(is_transient),
+            before_sleep=_count_retry,
         )
 
     async def complete(self, messages: List[Dict[str, Any]]) -> Tuple[str, Usage, float]:
-        payload = {"model": self._model, "messages": messages}
-        key = f"achat:{sha256_json(payload)}"
+        key = f"achat:{sha256_messages(self._model, messages)}"
 
         if self._cache:
-            hit = self._cache.get(key)
+            hit = await self._cache.aget(key)
             if hit is not None:
-                text, usage_dict = hit
-                usage = Usage(**usage_dict)
-                return text, usage, self._cost.estimate(usage).total_usd
+                # A hit spends nothing; the stored usage is what the original call cost.
+                return hit[0], Usage(), 0.0
+
+        text, usage_dict = await self._flight.do(key, lambda: self._complete_uncached(key, messages))
+        usage = Usage(**usage_dict)
+        return text, usage, self._cost.estimate(usage).total_usd
 
-        prompt_text = "\n".join([m.get("content","") for m in messages])
-        prompt_tokens = self._est.count(prompt_text)
+    async def _complete_uncached(self, key: str, messages: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+        with stage("tokenize"):
+            prompt_tokens = await self._est.acount_joined([m.get("content","") for m in messages])
 
         async def _call():
             with tracer.start_as_current_span("async.chat.completions.create") as span:
@@ -112,26 +178,125 @@ class AsyncLLMClient:
                 if self._limiter:
                     await self._limiter.acquire()
 
+                async def _create():
+                    with stage("llm"):
+                        return await self._client.chat.completions.create(
+                            model=self._model,
+                            messages=messages,
+                            temperature=0.0,
+                            timeout=self._timeout_s,
+                        )
+
+                async def _attempt():
+                    if self.concurrency is None:
+                        return await _create()
+                    async with self.concurrency.slot():
+                        return await _create()
+
+                async def _maybe_hedged():
+                    if self.hedging is None:
+                        return await _attempt(), 0
+                    return await hedged(self.hedging, _attempt)
+
                 @self._retry()
                 async def _do():
-                    resp = await self._client.chat.completions.create(
-                        model=self._model,
-                        messages=messages,
-                        temperature=0.0,
-                        timeout=self._timeout_s,
-                    )
-                    return resp
+                    if self._budget is None:
+                        return await _maybe_hedged(), 0
+                    reserved = await self._budget.acquire(prompt_tokens)
+                    try:
+                        return await _maybe_hedged(), reserved
+                    except BaseException as e:
+                        await self._budget.reconcile(reserved, _tokens_used_on_failure(e, reserved))
+                        raise
 
-                resp = await _do()
+                (resp, hedges), reserved = await _do()
+                if self.concurrency is not None:
+                    span.set_attribute("concurrency_limit", self.concurrency.limit)
                 text = resp.choices[0].message.content or ""
-                completion_tokens = self._est.count(text)
-                usage = Usage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                with stage("tokenize"):
+                    completion_tokens = await self._est.acount(text)
+                # A cancelled hedge has already been billed for its prompt.
+                usage = Usage(
+                    prompt_tokens=prompt_tokens * (1 + hedges),
+                    completion_tokens=completion_tokens,
+                    hedged_requests=hedges,
+                )
                 span.set_attribute("prompt_tokens_est", usage.prompt_tokens)
                 span.set_attribute("completion_tokens_est", usage.completion_tokens)
+                span.set_attribute("hedged_requests", hedges)
+                _record_spend(usage, self._cost)
+                if self._budget is not None:
+                    reported = getattr(resp, "usage", None)
+                    actual = getattr(reported, "total_tokens", None) or usage.total_tokens
+                    await self._budget.reconcile(reserved, actual + prompt_tokens * hedges)
                 return text, usage
 
         text, usage = await _call()
-        cost = self._cost.estimate(usage).total_usd
         if self._cache:
-            self._cache.set(key, (text, usage.__dict__), ttl_s=self._ttl_s)
-        return text, usage, cost
+            await self._cache.aset(key, (text, usage.__dict__), ttl_s=self._ttl_s)
+        return text, dict(usage.__dict__)
+
+    async def stream(self, messages: List[Dict[str, Any]]) -> AsyncIterator[Tuple[str, Optional[Usage], float]]:
+        # Yields (delta, None, 0.0) per text delta, then a final ("", usage, cost).
+        key = f"achat:{sha256_messages(self._model, messages)}"
+        if self._cache:
+            hit = await self._cache.aget(key)
+            if hit is not None:
+                yield hit[0], None, 0.0
+                yield "", Usage(), 0.0
+                return
+
+        with stage("tokenize"):
+            prompt_tokens = await self._est.acount_joined([m.get("content","") for m in messages])
+        with tracer.start_as_current_span("async.chat.completions.stream") as span:
+            span.set_attribute("model", self._model)
+            if self._limiter:
+                await self._limiter.acquire()
+            reserved = await self._budget.acquire(prompt_tokens) if self._budget else 0
+
+            @self._retry()
+            async def _open():
+                return await self._client.chat.completions.create(
+                    model=self._model,
+                    messages=messages,
+                    temperature=0.0,
+                    timeout=self._timeout_s,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+
+            parts: List[str] = []
+            reported = None
+            try:
+                async with self.concurrency.slot() if self.concurrency else nullcontext():
+                    with stage("llm"):
+                        resp = await _open()
+                        try:
+                            async for chunk in resp:
+                                reported = getattr(chunk, "usage", None) or reported
+                                delta = chunk.choices[0].delta.content if chunk.choices else None
+                                if delta:
+                                    parts.append(delta)
+                                    yield delta, None, 0.0
+                        finally:
+                            # Also runs when the consumer goes away mid-stream, which cancels the completion upstream.
+                            close = getattr(resp, "close", None)
+                            if close is not None:
+                                await close()
+            except BaseException as e:
+                if self._budget is not None:
+                    await self._budget.reconcile(reserved, _tokens_used_on_failure(e, reserved))
+                raise
+
+            text = "".join(parts)
+            with stage("tokenize"):
+                completion_tokens = await self._est.acount(text)
+            usage = Usage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            span.set_attribute("prompt_tokens_est", usage.prompt_tokens)
+            span.set_attribute("completion_tokens_est", usage.completion_tokens)
+            _record_spend(usage, self._cost)
+            if self._budget is not None:
+                await self._budget.reconcile(reserved, getattr(reported, "total_tokens", None) or usage.total_tokens)
+        if self._cache:
+            await self._cache.aset(key, (text, usage.__dict__), ttl_s=self._ttl_s)
+        yield "", usage, self._cost.estimate(usage).total_usd
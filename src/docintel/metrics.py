@@ -1,12 +1,14 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Optional, Dict
+from functools import lru_cache
+from typing import Any, List, Optional, Dict
+import asyncio
+import logging
 import os
 
-try:
-    import tiktoken
-except Exception:  # pragma: no cover
-    tiktoken = None
+from docintel.hashing import sha256_text
+
+log = logging.getLogger("docintel.metrics")
 
 DEFAULT_PRICING = {
     "gpt-4o-mini": {"input_per_1m": 0.15, "output_per_1m": 0.60},
@@ -25,6 +27,7 @@ def _env_float(key: str) -> Optional[float]:
 class Usage:
     prompt_tokens: int = 0
     completion_tokens: int = 0
+    hedged_requests: int = 0
 
     @property
     def total_tokens(self) -> int:
@@ -39,23 +42,81 @@ class Cost:
     def total_usd(self) -> float:
         return self.input_usd + self.output_usd
 
+@lru_cache(maxsize=None)
+def _encoding_for(model: str) -> Any | None:
+    try:
+        import tiktoken
+    except Exception:  # pragma: no cover
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        log.warning("tiktoken encoding unavailable; using word-count estimate", extra={"component": "metrics"})
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        log.warning("tiktoken encoding unavailable; using word-count estimate", extra={"component": "metrics"})
+        return None
+
+def _joins_cleanly(segments: List[str]) -> bool:
+    # With the cl100k/o200k pre-tokenizers no pre-token spans a "\n" followed by a character other
+    # than whitespace or "/", so counting each segment (with its separator) separately is exact.
+    return all(seg and not seg[0].isspace() and seg[0] != "/" for seg in segments[1:])
+
 class TokenEstimator:
-    def __init__(self, model: str):
-        self._enc = None
-        if tiktoken is not None:
-            try:
-                self._enc = tiktoken.encoding_for_model(model)
-            except Exception:
-                self._enc = tiktoken.get_encoding("cl100k_base")
+    offload_chars = 64_000
+
+    def __init__(self, model: str, memo_max: int = 50_000):
+        self._model = model
+        self._memo: Dict[str, int] = {}
+        self._memo_max = memo_max
+
+    @property
+    def _enc(self) -> Any | None:
+        return _encoding_for(self._model)
 
     def count(self, text: str) -> int:
         if not text:
             return 0
-        if self._enc is not None:
-            return len(self._enc.encode(text))
+        enc = self._enc
+        if enc is not None:
+            return len(enc.encode_ordinary(text))
         words = max(1, len(text.split()))
         return int(words / 0.75)
 
+    def count_cached(self, text: str) -> int:
+        key = sha256_text(text)
+        n = self._memo.get(key)
+        if n is None:
+            n = self.count(text)
+            if len(self._memo) >= self._memo_max:
+                self._memo.clear()
+            self._memo[key] = n
+        return n
+
+    def count_joined(self, segments: List[str], sep: str = "\n") -> int:
+        if sep != "\n" or self._enc is None or not _joins_cleanly(segments):
+            return self.count(sep.join(segments))
+        last = len(segments) - 1
+        return sum(self.count_cached(seg + sep if i < last else seg) for i, seg in enumerate(segments))
+
+    async def acount(self, text: str) -> int:
+        if len(text) < self.offload_chars:
+            return self.count(text)
+        return await asyncio.to_thread(self.count, text)
+
+    async def acount_joined(self, segments: List[str], sep: str = "\n") -> int:
+        if sum(len(seg) for seg in segments) < self.offload_chars:
+            return self.count_joined(segments, sep)
+        return await asyncio.to_thread(self.count_joined, segments, sep)
+
+@lru_cache(maxsize=None)
+def get_estimator(model: str) -> TokenEstimator:
+    return TokenEstimator(model)
+
 class CostModel:
     def __init__(self, model: str, pricing: Optional[Dict[str, Dict[str, float]]] = None):
         self._model = model
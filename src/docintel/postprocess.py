@@ -1,17 +1,192 @@
 from __future__ import annotations
 import json
 import re
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple, Type, get_origin
+from pydantic import BaseModel
 
-_JSON_BLOCK_RE = re.compile(r"\{.*\}", re.DOTALL)
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_QUOTES = {'"': '"', "'": "'", "\u201c": "\u201d", "\u2018": "\u2019"}
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+def _balanced_object(text: str) -> str | None:
+    # First top-level {...}, honoring strings, instead of a greedy first-brace-to-last-brace match.
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth = 0
+    in_str = False
+    esc = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+def repair_json(candidate: str) -> Any:
+    # Best-effort parse of almost-JSON: single/smart quotes, Python literals, bare keys,
+    # trailing commas, raw newlines in strings and output truncated mid-structure.
+    out: List[str] = []
+    stack: List[str] = []
+    # Places where the text can be cut and closed into a valid document if the tail is unusable.
+    cuts: List[Tuple[int, str]] = []
+    quote = ""
+    esc = False
+    i = 0
+    n = len(candidate)
+    while i < n:
+        ch = candidate[i]
+        if quote:
+            if esc:
+                esc = False
+                out.append(ch)
+            elif ch == "\\":
+                esc = True
+                out.append(ch)
+            elif ch == quote:
+                quote = ""
+                out.append('"')
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+        elif ch in _QUOTES:
+            quote = _QUOTES[ch]
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+            cuts.append((len(out), "".join(_CLOSERS[c] for c in reversed(stack))))
+        elif ch in "}]":
+            while out and out[-1] in " \t\r\n,":
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(ch)
+        elif ch == ",":
+            cuts.append((len(out), "".join(_CLOSERS[c] for c in reversed(stack))))
+            out.append(ch)
+        elif ch.isalpha():
+            j = i
+            while j < n and (candidate[j].isalnum() or candidate[j] == "_"):
+                j += 1
+            word = candidate[i:j]
+            if word in _LITERALS:
+                out.append(_LITERALS[word])
+            elif candidate[j:].lstrip().startswith(":"):
+                out.append(json.dumps(word))
+            else:
+                out.append(word)
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    closing = "".join(_CLOSERS[c] for c in reversed(stack))
+    # A string cut off mid-way is not trusted as a value; drop it along with its member below.
+    if not quote:
+        while out and out[-1] in " \t\r\n,":
+            out.pop()
+        text = "".join(out)
+        if text.endswith(":"):
+            text += " null"
+        try:
+            return json.loads(text + closing)
+        except json.JSONDecodeError:
+            if not closing:
+                raise
+    # Truncated mid-value: back off to the last complete member and close from there.
+    for pos, closers in reversed(cuts[-64:]):
+        try:
+            return json.loads("".join(out[:pos]) + closers)
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("Could not repair JSON object in LLM output.")
 
 def extract_json_object(text: str) -> Dict[str, Any]:
-    m = _JSON_BLOCK_RE.search(text)
-    if not m:
+    fenced = _FENCE_RE.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = fenced.group(1)
+    candidate = _balanced_object(text)
+    if candidate is None:
         raise ValueError("No JSON object found in LLM output.")
-    candidate = m.group(0)
-    candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
-    return json.loads(candidate)
+    try:
+        obj = json.loads(candidate)
+    except json.JSONDecodeError:
+        obj = repair_json(candidate)
+    if not isinstance(obj, dict):
+        raise ValueError("LLM output is not a JSON object.")
+    return obj
+
+class IncrementalFields:
+    # Fed streamed deltas of a JSON object; returns each top-level member once its value is complete.
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._member_start = -1
+        self.done = False
+
+    def feed(self, delta: str) -> List[Tuple[str, Any]]:
+        self._buf += delta
+        out: List[Tuple[str, Any]] = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf) and not self.done:
+            ch = buf[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                if self._depth > 0:
+                    self._in_str = True
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = i + 1
+            elif ch in "}]" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buf[self._member_start:i], out)
+                    self.done = True
+            elif ch == "," and self._depth == 1:
+                self._emit(buf[self._member_start:i], out)
+                self._member_start = i + 1
+            i += 1
+        self._pos = i
+        return out
+
+    @staticmethod
+    def _emit(member: str, out: List[Tuple[str, Any]]) -> None:
+        if not member.strip():
+            return
+        try:
+            out.extend(json.loads("{" + member + "}").items())
+        except json.JSONDecodeError:
+            # Left for the final parse/repair of the whole completion.
+            pass
 
 def coerce_common_fields(obj: Dict[str, Any]) -> Dict[str, Any]:
     if "total_amount" in obj and isinstance(obj.get("total_amount"), str):
@@ -25,3 +200,25 @@ def coerce_common_fields(obj: Dict[str, Any]) -> Dict[str, Any]:
         except Exception:
             pass
     return obj
+
+def _dedupe_key(item: Any) -> str:
+    if isinstance(item, str):
+        return " ".join(item.split()).lower()
+    return json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+
+def merge_partials(schema_model: Type[BaseModel], partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged: Dict[str, Any] = {}
+    for name, field in schema_model.model_fields.items():
+        if get_origin(field.annotation) is list:
+            seen = set()
+            items = []
+            for p in partials:
+                for item in p.get(name) or []:
+                    k = _dedupe_key(item)
+                    if k not in seen:
+                        seen.add(k)
+                        items.append(item)
+            merged[name] = items
+        else:
+            merged[name] = next((p[name] for p in partials if p.get(name) not in (None, "")), None)
+    return merged
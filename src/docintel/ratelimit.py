@@ -0,0 +1,144 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Optional, Tuple
+import asyncio
+import sqlite3
+import threading
+import time
+
+from aiolimiter import AsyncLimiter
+
+def _take(tokens: float, amount: float, rate: float) -> Tuple[float, float]:
+    if tokens >= amount:
+        return tokens - amount, 0.0
+    return tokens, (amount - tokens) / rate
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None):
+        self._rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float = 1.0) -> float:
+        self._refill()
+        self._tokens, wait = _take(self._tokens, amount, self._rate)
+        return wait
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+# Token bucket state lives in SQLite so every worker process on the host draws from one budget.
+class SharedTokenBucket:
+    def __init__(self, path: Path, name: str, rate: float, capacity: float | None = None):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._name = name
+        self._rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+        self._lock = threading.Lock()
+
+    def _update(self, fn) -> float:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self._name,)).fetchone()
+                tokens = self.capacity if row is None else min(self.capacity, row[0] + max(0.0, now - row[1]) * self._rate)
+                tokens, out = fn(tokens)
+                self._conn.execute(
+                    "INSERT INTO buckets (name, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (self._name, tokens, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return out
+
+    def try_acquire(self, amount: float = 1.0) -> float:
+        return self._update(lambda tokens: _take(tokens, amount, self._rate))
+
+    def refund(self, amount: float) -> None:
+        # Negative amounts debit further; the balance may go below zero and is paid back by refill.
+        self._update(lambda tokens: (min(self.capacity, tokens + amount), 0.0))
+
+    def acquire_sync(self, amount: float = 1.0) -> None:
+        while True:
+            wait = self.try_acquire(amount)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire, amount)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def close(self) -> None:
+        self._conn.close()
+
+def build_limiter(settings, name: str = "llm") -> Any | None:
+    if settings.max_rps <= 0:
+        return None
+    if settings.rate_limiter == "shared":
+        return SharedTokenBucket(settings.cache_dir / "ratelimit.sqlite3", name, rate=settings.max_rps)
+    return AsyncLimiter(max_rate=settings.max_rps, time_period=1)
+
+class TokenBudget:
+    # Provider quotas: requests per minute and tokens per minute, both enforced before each call.
+    def __init__(self, requests: Any | None, tokens: Any | None, expected_completion_tokens: int = 512):
+        self._requests = requests
+        self._tokens = tokens
+        self.expected_completion_tokens = expected_completion_tokens
+
+    async def acquire(self, prompt_tokens: int) -> int:
+        if self._requests is not None:
+            await _acquire(self._requests, 1.0)
+        reserved = prompt_tokens + self.expected_completion_tokens
+        if self._tokens is not None:
+            # A call larger than the whole quota waits for a full bucket instead of forever.
+            reserved = min(reserved, int(self._tokens.capacity))
+            await _acquire(self._tokens, float(reserved))
+        return reserved
+
+    async def reconcile(self, reserved: int, actual: int) -> None:
+        if self._tokens is not None and actual != reserved:
+            await _run(self._tokens.refund, float(reserved - actual))
+
+async def _run(fn, *args):
+    # In-process buckets are plain arithmetic; SQLite-backed ones go to a thread.
+    if isinstance(getattr(fn, "__self__", None), SharedTokenBucket):
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+async def _acquire(bucket: Any, amount: float) -> None:
+    while True:
+        wait = await _run(bucket.try_acquire, amount)
+        if wait <= 0:
+            return
+        await asyncio.sleep(wait)
+
+def build_token_budget(settings, name: str = "llm") -> Optional[TokenBudget]:
+    if settings.rpm_limit <= 0 and settings.tpm_limit <= 0:
+        return None
+
+    def _bucket(suffix: str, per_minute: int):
+        if per_minute <= 0:
+            return None
+        if settings.rate_limiter == "shared":
+            return SharedTokenBucket(settings.cache_dir / "ratelimit.sqlite3", f"{name}:{suffix}", rate=per_minute / 60, capacity=per_minute)
+        return TokenBucket(rate=per_minute / 60, capacity=per_minute)
+
+    return TokenBudget(_bucket("rpm", settings.rpm_limit), _bucket("tpm", settings.tpm_limit), settings.expected_completion_tokens)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple, Type
+import math
+import re
+
+from pydantic import BaseModel
+
+from docintel.chunking import Chunk
+
+# Words are runs of Unicode letters and digits; underscores and everything else separate them.
+_TOKEN_RE = re.compile(r"[^\W_]+")
+_STOPWORDS = frozenset("a an and are as at be by for from if in is it of on or the to with".split())
+# Parenthesised notes in field descriptions, e.g. "(ISO preferred)", tell the model how to format a
+# value; they are not words the document uses, so they stay out of the query.
+_NOTE_RE = re.compile(r"\([^)]*\)")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+@lru_cache(maxsize=None)
+def schema_query(schema_model: Type[BaseModel]) -> Tuple[str, ...]:
+    terms: List[str] = []
+    for name, field in schema_model.model_fields.items():
+        if name == "schema_name":
+            continue
+        terms.extend(name.split("_"))
+        if field.description:
+            terms.extend(tokenize(_NOTE_RE.sub(" ", field.description)))
+    return tuple(dict.fromkeys(t for t in terms if t not in _STOPWORDS))
+
+class BM25Index:
+    def __init__(self, docs: Sequence[str], vocabulary: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self._k1 = k1
+        self._b = b
+        # Each chunk is tokenised once; the index only keeps frequencies for the query vocabulary.
+        vocab = frozenset(vocabulary)
+        self._tfs: List[Dict[str, int]] = []
+        self._lens: List[int] = []
+        for d in docs:
+            words = tokenize(d)
+            self._tfs.append(Counter([w for w in words if w in vocab]))
+            self._lens.append(len(words))
+        self._avgdl = (sum(self._lens) / len(self._lens)) if self._lens else 0.0
+        df: Counter = Counter()
+        for tf in self._tfs:
+            df.update(tf.keys())
+        n = len(self._tfs)
+        self._idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, query: Sequence[str]) -> List[float]:
+        terms = [(t, self._idf[t]) for t in query if t in self._idf]
+        out: List[float] = []
+        for tf, dl in zip(self._tfs, self._lens):
+            norm = self._k1 * (1 - self._b + self._b * dl / self._avgdl) if self._avgdl else self._k1
+            score = 0.0
+            for t, idf in terms:
+                f = tf.get(t)
+                if f:
+                    score += idf * f * (self._k1 + 1) / (f + norm)
+            out.append(score)
+        return out
+
+    def top_k(self, query: Sequence[str], k: int) -> List[int]:
+        scores = self.scores(query)
+        return sorted(range(len(scores)), key=lambda i: (-scores[i], i))[:k]
+
+def rank_chunks(chunks: List[Chunk], schema_model: Type[BaseModel]) -> List[Chunk]:
+    if len(chunks) <= 1:
+        return list(chunks)
+    # The opening chunk usually carries parties, titles and dates, so it always ranks first.
+    query = schema_query(schema_model)
+    index = BM25Index([c.text for c in chunks[1:]], vocabulary=query)
+    return [chunks[0]] + [chunks[i + 1] for i in index.top_k(query, len(chunks) - 1)]
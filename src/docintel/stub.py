@@ -0,0 +1,179 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+
+import httpx
+import openai
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from openai.types.completion_usage import CompletionUsage
+
+from docintel.prompts import FIELD_REPAIR_SYSTEM
+
+# Offline stand-in for OpenAI/AsyncOpenAI: deterministic schema-shaped JSON, configurable
+# latency, and injected 429/500 errors. Only chat.completions.create is implemented.
+
+@dataclass(frozen=True)
+class StubConfig:
+    latency_ms: float = 200.0
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after_s: float = 1.0
+    seed: int = 0
+    stream_chunk_chars: int = 16
+
+def stub_config(settings) -> StubConfig:
+    return StubConfig(
+        latency_ms=settings.stub_latency_ms,
+        latency_sigma=settings.stub_latency_sigma,
+        error_rate=settings.stub_error_rate,
+        throttle_rate=settings.stub_throttle_rate,
+        seed=settings.stub_seed,
+    )
+
+_REQUEST = httpx.Request("POST", "http://stub.local/v1/chat/completions")
+
+def _value(name: str, prop: Dict[str, Any], digest: str) -> Any:
+    if "const" in prop:
+        return prop["const"]
+    types = {prop.get("type")} | {p.get("type") for p in prop.get("anyOf", [])}
+    if "array" in types:
+        return [f"{name} {digest[:6]} #{i}" for i in (1, 2)]
+    if "number" in types or "integer" in types:
+        return round(int(digest[:6], 16) / 100, 2)
+    if "boolean" in types:
+        return int(digest[0], 16) % 2 == 0
+    return f"{name} {digest[:8]}"
+
+def _reply(messages: List[Dict[str, Any]]) -> str:
+    system = messages[0].get("content", "") if messages else ""
+    user = messages[-1].get("content", "") if messages else ""
+    digest = hashlib.sha256(user.encode("utf-8")).hexdigest()
+    if system == FIELD_REPAIR_SYSTEM:
+        fields = json.loads(user).get("fields", {})
+        return json.dumps({k: _value(k, v.get("schema", {}), digest) for k, v in fields.items()})
+    _, _, schema_json = system.partition("JSON schema:\n")
+    try:
+        props = json.loads(schema_json).get("properties", {})
+    except json.JSONDecodeError:
+        props = {}
+    return json.dumps({k: _value(k, v, digest) for k, v in props.items()}, ensure_ascii=False)
+
+class _StubCore:
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def plan(self, kwargs: Dict[str, Any]) -> Tuple[float, Optional[Exception], str, CompletionUsage]:
+        c = self.config
+        with self._lock:
+            self.calls += 1
+            roll = self._rng.random()
+            delay = self._rng.lognormvariate(math.log(max(c.latency_ms, 0.001)), c.latency_sigma) / 1000 if c.latency_ms > 0 else 0.0
+        if roll < c.throttle_rate:
+            resp = httpx.Response(429, headers={"retry-after": str(c.retry_after_s)}, request=_REQUEST)
+            return 0.0, openai.RateLimitError("stub: rate limited", response=resp, body=None), "", CompletionUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        if roll < c.throttle_rate + c.error_rate:
+            resp = httpx.Response(500, request=_REQUEST)
+            return delay / 2, openai.InternalServerError("stub: server error", response=resp, body=None), "", CompletionUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        messages = kwargs.get("messages") or []
+        text = _reply(messages)
+        prompt = sum(len(m.get("content", "")) for m in messages) // 4
+        usage = CompletionUsage(prompt_tokens=prompt, completion_tokens=len(text) // 4, total_tokens=prompt + len(text) // 4)
+        return delay, None, text, usage
+
+    def completion(self, kwargs: Dict[str, Any], text: str, usage: CompletionUsage) -> ChatCompletion:
+        return ChatCompletion.model_validate({
+            "id": f"stub-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": kwargs.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            "usage": usage.model_dump(),
+        })
+
+    def chunks(self, kwargs: Dict[str, Any], text: str, usage: CompletionUsage) -> List[ChatCompletionChunk]:
+        base = {"id": f"stub-{self.calls}", "object": "chat.completion.chunk", "created": int(time.time()), "model": kwargs.get("model", "stub")}
+        step = self.config.stream_chunk_chars
+        out = [
+            ChatCompletionChunk.model_validate({**base, "choices": [{"index": 0, "delta": {"content": text[i:i + step]}}]})
+            for i in range(0, len(text), step)
+        ]
+        out.append(ChatCompletionChunk.model_validate({**base, "choices": [], "usage": usage.model_dump()}))
+        return out
+
+class _AsyncStream:
+    def __init__(self, chunks: List[ChatCompletionChunk], per_chunk_s: float):
+        self._chunks = chunks
+        self._per_chunk_s = per_chunk_s
+        self.closed = False
+
+    def __aiter__(self) -> AsyncIterator[ChatCompletionChunk]:
+        return self._iter()
+
+    async def _iter(self) -> AsyncIterator[ChatCompletionChunk]:
+        for c in self._chunks:
+            if self.closed:
+                return
+            await asyncio.sleep(self._per_chunk_s)
+            yield c
+
+    async def close(self) -> None:
+        self.closed = True
+
+class _AsyncCompletions:
+    def __init__(self, core: _StubCore):
+        self._core = core
+
+    async def create(self, **kwargs: Any):
+        delay, error, text, usage = self._core.plan(kwargs)
+        if not kwargs.get("stream"):
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return self._core.completion(kwargs, text, usage)
+        # Time to first token is a third of the sampled latency; the rest is spread over the chunks.
+        await asyncio.sleep(delay / 3)
+        if error is not None:
+            raise error
+        chunks = self._core.chunks(kwargs, text, usage)
+        return _AsyncStream(chunks, (delay * 2 / 3) / len(chunks))
+
+class _Completions:
+    def __init__(self, core: _StubCore):
+        self._core = core
+
+    def create(self, **kwargs: Any):
+        delay, error, text, usage = self._core.plan(kwargs)
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        if kwargs.get("stream"):
+            return iter(self._core.chunks(kwargs, text, usage))
+        return self._core.completion(kwargs, text, usage)
+
+class StubAsyncOpenAI:
+    def __init__(self, config: StubConfig | None = None):
+        self.stub = _StubCore(config or StubConfig())
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(self.stub))
+
+    async def close(self) -> None:
+        pass
+
+class StubOpenAI:
+    def __init__(self, config: StubConfig | None = None):
+        self.stub = _StubCore(config or StubConfig())
+        self.chat = SimpleNamespace(completions=_Completions(self.stub))
+
+    def close(self) -> None:
+        pass
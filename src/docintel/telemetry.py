@@ -0,0 +1,257 @@
+from __future__ import annotations
+from bisect import bisect_left
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import cProfile
+import random
+import threading
+import time
+import uuid
+
+# Minimal Prometheus text-format registry. Hot-path updates are a lock and an add; anything
+# that already lives elsewhere (cache stats, repair stats, limiter state) is read at scrape time.
+
+Sample = Tuple[Dict[str, str], float]
+
+@dataclass
+class RequestTrace:
+    # Summed wall time per stage; concurrent map-reduce windows can add up to more than the request took.
+    stages: Dict[str, float] = field(default_factory=dict)
+    retries: int = 0
+    # Also updated from to_thread workers (ingest, disk-cache lookups, sync retries).
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self) -> Tuple[Dict[str, float], int]:
+        with self._lock:
+            return dict(self.stages), self.retries
+
+_trace: ContextVar[Optional[RequestTrace]] = ContextVar("docintel_trace", default=None)
+
+@contextmanager
+def traced() -> Iterator[RequestTrace]:
+    # Tasks and to_thread calls started inside inherit the trace through the context.
+    trace = RequestTrace()
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+_STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _fmt_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+class _Histo:
+    __slots__ = ("_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self, stage: Optional[str] = None) -> "_Timer":
+        return _Timer(self, stage)
+
+class _Timer:
+    __slots__ = ("_histo", "_stage", "_t0")
+
+    def __init__(self, histo: _Histo, stage: Optional[str]):
+        self._histo = histo
+        self._stage = stage
+
+    def __enter__(self) -> "_Timer":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self._t0
+        self._histo.observe(elapsed)
+        if self._stage is not None:
+            trace = _trace.get()
+            if trace is not None:
+                trace.add(self._stage, elapsed)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self._labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self._labelnames:
+            self._children[()] = self._new()
+
+    def _new(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new())
+        return child
+
+    def _samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        for values, child in list(self._children.items()):
+            yield self.name, dict(zip(self._labelnames, values)), child.value
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._children[()].inc(amount)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._children[()].dec(amount)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = _STAGE_BUCKETS):
+        self._bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new(self):
+        return _Histo(self._bounds)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def time(self, stage: Optional[str] = None) -> _Timer:
+        return self._children[()].time(stage)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            labels = dict(zip(self._labelnames, values))
+            cumulative = 0
+            for bound, n in zip(self._bounds + (float("inf"),), child.counts):
+                cumulative += n
+                yield f"{self.name}_bucket", {**labels, "le": _fmt_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, child.sum
+            yield f"{self.name}_count", labels, cumulative
+
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn: Collector) -> None:
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {m.kind}"]
+            lines += [f"{name}{_fmt_labels(labels)} {_fmt_value(v)}" for name, labels, v in m._samples()]
+        for fn in self._collectors:
+            for name, kind, help, samples in fn():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_fmt_labels(labels)} {_fmt_value(v)}" for labels, v in samples]
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "docintel_stage_seconds", "Time spent per pipeline stage.", ["stage"],
+))
+CACHE_LOOKUP_SECONDS = REGISTRY.register(Histogram(
+    "docintel_cache_lookup_seconds", "Cache lookup latency per tier.", ["tier"],
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+))
+LLM_RETRIES = REGISTRY.register(Counter("docintel_llm_retries_total", "LLM call attempts that were retried."))
+LLM_TOKENS = REGISTRY.register(Counter("docintel_llm_tokens_total", "Estimated tokens sent to / received from the LLM.", ["direction"]))
+LLM_COST_USD = REGISTRY.register(Counter("docintel_llm_cost_usd_total", "Estimated LLM spend in USD."))
+IN_FLIGHT = REGISTRY.register(Gauge("docintel_http_requests_in_flight", "HTTP requests currently being served."))
+
+def stage(name: str) -> _Timer:
+    return STAGE_SECONDS.labels(name).time(name)
+
+def note_retry() -> None:
+    LLM_RETRIES.inc()
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_retry()
+
+_profiling = threading.Lock()
+
+def _dump_profile(prof: cProfile.Profile, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    prof.dump_stats(str(path))
+
+@asynccontextmanager
+async def sampled_profile(rate: float, directory: Path) -> AsyncIterator[Optional[Path]]:
+    # cProfile hooks the whole event-loop thread, so at most one request is profiled at a time and
+    # the dump also contains whatever else the loop ran meanwhile. Work handed to threads is not seen.
+    if rate <= 0 or random.random() >= rate or not _profiling.acquire(blocking=False):
+        yield None
+        return
+    path = directory / f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.prof"
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield path
+    finally:
+        prof.disable()
+        _profiling.release()
+        # Serialising the stats and the file write stay off the loop.
+        await asyncio.to_thread(_dump_profile, prof, path)
@@ -2,10 +2,6 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Optional
 from opentelemetry import trace
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 
 @dataclass(frozen=True)
 class TracingConfig:
@@ -13,9 +9,18 @@ class TracingConfig:
     otlp_endpoint: Optional[str] = None
 
 def configure_tracing(cfg: TracingConfig) -> None:
+    # The SDK and exporters are only needed once tracing is actually configured; the OTLP one is the heaviest.
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
     resource = Resource.create({"service.name": cfg.service_name})
     provider = TracerProvider(resource=resource)
-    exporter = OTLPSpanExporter(endpoint=cfg.otlp_endpoint) if cfg.otlp_endpoint else ConsoleSpanExporter()
+    if cfg.otlp_endpoint:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter(endpoint=cfg.otlp_endpoint)
+    else:
+        exporter = ConsoleSpanExporter()
     provider.add_span_processor(BatchSpanProcessor(exporter))
     trace.set_tracer_provider(provider)
 
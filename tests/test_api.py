@@ -0,0 +1,90 @@
+import json
+import time
+import asyncio
+from fastapi.testclient import TestClient
+
+from docintel import api
+from docintel.config import DISettings
+from docintel.extractor import ExtractionResult
+from docintel.metrics import Usage
+
+class FakeExtractor:
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    async def extract(self, schema_name, schema_model, doc_id, text):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        if "boom" in text:
+            raise RuntimeError("llm failed")
+        res = ExtractionResult(schema=schema_name, doc_id=doc_id, data={"counterparty": text}, confidence=0.85, used_chunks=1)
+        return res, Usage(prompt_tokens=10, completion_tokens=2), 0.001
+
+def test_batch_runs_concurrently_with_per_item_results():
+    fake = FakeExtractor()
+    api._state.clear()
+    api._state.update({"s": DISettings(batch_concurrency=3), "cache": None, "aext": fake})
+    try:
+        items = [{"schema": "contract", "raw_text": f"doc {i}", "doc_id": f"d{i}"} for i in range(6)]
+        items[2]["raw_text"] = "boom"
+        items.append({"schema": "contract"})
+        r = TestClient(api.app).post("/extract/batch", json={"schema": "contract", "items": items})
+    finally:
+        api._state.clear()
+
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["index"] for x in results] == list(range(7))
+    assert [x["ok"] for x in results] == [True, True, False, True, True, True, False]
+    assert results[0]["result"]["doc_id"] == "d0"
+    assert "llm failed" in results[2]["error"]
+    assert 1 < fake.peak <= 3
+
+def test_upload_endpoint_reads_stream_without_temp_file(tmp_path):
+    fake = FakeExtractor()
+    api._state.clear()
+    api._state.update({"s": DISettings(cache_dir=tmp_path), "cache": None, "aext": fake})
+    try:
+        files = {"file": ("../../contract.txt", b"Agreement   with Alpha Widgets.", "text/plain")}
+        r = TestClient(api.app).post("/extract/upload", data={"schema": "contract"}, files=files)
+        bad = TestClient(api.app).post("/extract/upload", data={"schema": "contract"}, files={"file": ("x.docx", b"..", "application/octet-stream")})
+    finally:
+        api._state.clear()
+
+    assert r.status_code == 200
+    assert r.json()["doc_id"] == "contract.txt"
+    assert r.json()["data"]["counterparty"] == "Agreement with Alpha Widgets."
+    assert bad.status_code == 400
+    assert not (tmp_path / "_uploads").exists()
+
+def test_jobs_enqueue_progress_and_ndjson_results(tmp_path, monkeypatch):
+    monkeypatch.setenv("DI_CACHE_DIR", str(tmp_path))
+    fake = FakeExtractor()
+    api._state.clear()
+    api._state.update({"s": DISettings(cache_dir=tmp_path, jobs_concurrency=2), "cache": None, "aext": fake})
+    try:
+        with TestClient(api.app) as client:
+            items = [{"schema": "contract", "raw_text": f"doc {i}", "doc_id": f"d{i}"} for i in range(5)]
+            items[1]["raw_text"] = "boom"
+            created = client.post("/jobs", json={"schema": "contract", "items": items})
+            assert created.status_code == 202
+            job_id = created.json()["job_id"]
+
+            for _ in range(100):
+                st = client.get(f"/jobs/{job_id}").json()
+                if st["state"] == "completed":
+                    break
+                time.sleep(0.02)
+            assert (st["done"], st["failed"]) == (4, 1)
+
+            r = client.get(f"/jobs/{job_id}/results")
+            rows = [json.loads(line) for line in r.text.splitlines()]
+            assert r.headers["content-type"].startswith("application/x-ndjson")
+            assert [row["index"] for row in rows] == list(range(5))
+            assert rows[1]["ok"] is False and rows[0]["result"]["doc_id"] == "d0"
+            assert client.get("/jobs/nope").status_code == 404
+    finally:
+        api._state.clear()
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from docintel.bulk import BulkItem, iter_items, run_bulk
+from docintel.extractor import ExtractionResult
+from docintel.metrics import Usage
+
+def test_iter_items_from_dir_glob_and_manifest(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "b.md").write_text("b")
+    (tmp_path / "skip.docx").write_text("c")
+    manifest = tmp_path / "m.jsonl"
+    manifest.write_text(
+        '{"path": "x.pdf", "schema": "invoice", "doc_id": "X"}\n\n{"title": "no path"}\n{"path": "broken\n'
+        '{"path": "/abs/y.txt"}\n'
+    )
+
+    assert [i.path for i in iter_items(str(tmp_path), "contract")] == [str(tmp_path / "a.txt"), str(tmp_path / "b.md")]
+    assert [i.path for i in iter_items(str(tmp_path / "*.md"), "contract")] == [str(tmp_path / "b.md")]
+    assert list(iter_items(str(manifest), "contract")) == [
+        BulkItem(path=str(tmp_path / "x.pdf"), schema="invoice", doc_id="X"),
+        BulkItem(path="/abs/y.txt", schema="contract"),
+    ]
+
+def test_run_bulk_streams_results_and_resumes(tmp_path):
+    items = [BulkItem(path=f"doc{i}.txt", schema="contract") for i in range(6)]
+    calls = []
+    fail = {"doc3.txt"}
+
+    async def _extract(item):
+        calls.append(item.path)
+        await asyncio.sleep(0.01)
+        if item.path in fail:
+            raise RuntimeError("bad document")
+        res = ExtractionResult(schema=item.schema, doc_id=item.path, data={}, confidence=0.85, used_chunks=1)
+        return res, Usage(prompt_tokens=100, completion_tokens=10), 0.01
+
+    out, ckpt = tmp_path / "out.jsonl", tmp_path / "out.jsonl.ckpt"
+    stats = asyncio.run(run_bulk(items, _extract, out, ckpt, concurrency=3))
+    assert (stats.ok, stats.failed, stats.skipped) == (5, 1, 0)
+    assert stats.prompt_tokens == 500
+
+    fail.clear()
+    calls.clear()
+    stats = asyncio.run(run_bulk(items, _extract, out, ckpt, concurrency=3))
+    assert calls == ["doc3.txt"]
+    assert (stats.ok, stats.failed, stats.skipped) == (1, 0, 5)
+
+    rows = [json.loads(line) for line in out.read_text().splitlines()]
+    assert len(rows) == 7
+    assert sum(r["ok"] for r in rows) == 6
@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+from docintel.cache import DiskCache, MemoryCache, SingleFlight, TieredCache
+
+def test_memory_cache_lru_and_ttl():
+    mem = MemoryCache(max_items=2, ttl_s=60)
+    mem.set("a", 1)
+    mem.set("b", 2)
+    assert mem.get("a") == 1
+    mem.set("c", 3)
+    assert mem.get("b") is None
+    assert mem.get("a") == 1 and mem.get("c") == 3
+
+    mem.set("short", "x", ttl_s=0)
+    time.sleep(0.01)
+    assert mem.get("short") is None
+
+def test_tiered_cache_async_promotes_disk_hits(tmp_path):
+    disk = DiskCache(str(tmp_path))
+    disk.set("k", ("text", {"prompt_tokens": 1, "completion_tokens": 2}))
+    cache = TieredCache(disk, MemoryCache(max_items=8))
+
+    async def _run():
+        first = await cache.aget("k")
+        second = await cache.aget("k")
+        missing = await cache.aget("nope")
+        await cache.aset("new", "v")
+        return first, second, missing
+
+    first, second, missing = asyncio.run(_run())
+    assert first == second == ("text", {"prompt_tokens": 1, "completion_tokens": 2})
+    assert missing is None
+    assert disk.get("new") == "v"
+
+    stats = cache.stats()
+    assert stats["memory"].hits == 1
+    assert stats["memory"].misses == 2
+    assert stats["disk"].hits == 2
+    assert stats["disk"].misses == 1
+    cache.close()
+
+def test_single_flight_coalesces_and_propagates_errors():
+    flight = SingleFlight()
+    calls = {"n": 0}
+
+    async def _work():
+        calls["n"] += 1
+        await asyncio.sleep(0.02)
+        return "text", {"prompt_tokens": 5, "completion_tokens": 1}
+
+    async def _fail():
+        calls["n"] += 1
+        await asyncio.sleep(0.02)
+        raise RuntimeError("boom")
+
+    async def _run():
+        ok = await asyncio.gather(*[flight.do("k", _work) for _ in range(5)])
+        bad = await asyncio.gather(*[flight.do("bad", _fail) for _ in range(3)], return_exceptions=True)
+        retry = await flight.do("bad", _work)
+        return ok, bad, retry
+
+    ok, bad, retry = asyncio.run(_run())
+    assert all(r == ok[0] for r in ok)
+    assert all(isinstance(e, RuntimeError) for e in bad)
+    assert retry[0] == "text"
+    assert calls["n"] == 3
+    assert flight.coalesced == 6
+
+def test_disk_cache_compresses_and_reads_uncompressed_entries(tmp_path):
+    text = "Agreement with Alpha Widgets. " * 200
+    plain = DiskCache(str(tmp_path / "plain"), compress_level=0)
+    packed = DiskCache(str(tmp_path / "packed"))
+    for cache in (plain, packed):
+        cache.set("achat:1", (text, {"prompt_tokens": 1}))
+        cache.set("chat:small", "ok")
+    sizes = {name: c.usage()["achat"]["bytes"] for name, c in (("plain", plain), ("packed", packed))}
+    assert sizes["packed"] * 10 < sizes["plain"]
+    assert packed.get("achat:1") == (text, {"prompt_tokens": 1}) and packed.get("chat:small") == "ok"
+    plain.close()
+
+    # Compression can be switched on for an existing cache; older entries stay readable.
+    reopened = DiskCache(str(tmp_path / "plain"))
+    assert reopened.get("achat:1") == (text, {"prompt_tokens": 1})
+    reopened.close()
+    packed.close()
+
+def test_disk_cache_usage_by_prefix_persists_lookups_and_prunes(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    for i in range(3):
+        cache.set(f"chat:{i}", f"reply {i}")
+    cache.set("extract:a", {"data": {}})
+    cache.get("chat:0")
+    cache.get("chat:missing")
+    cache.close()
+
+    # A second process (here: a fresh handle) sees the counters and the per-prefix totals.
+    cache = DiskCache(str(tmp_path))
+    usage = cache.usage()
+    assert usage["chat"]["entries"] == 3 and usage["chat"]["bytes"] > 0
+    assert usage["chat"]["hits"] == 1 and usage["chat"]["misses"] == 1
+    assert usage["extract"]["entries"] == 1
+    assert cache.prune("chat") == 3
+    assert "chat" not in cache.usage() or cache.usage()["chat"]["entries"] == 0
+    assert cache.get("extract:a") == {"data": {}}
+    cache.close()
+
+def test_disk_cache_size_limit_evicts(tmp_path):
+    cache = DiskCache(str(tmp_path), size_limit_bytes=2 * 2**20, compress_level=0)
+    blob = b"x" * 300_000
+    cache.get("pdfpage:missing")
+    cache.flush_stats()
+    for i in range(20):
+        cache.set(f"pdfpage:{i}", blob + bytes([i]))
+    cache.prune()
+    usage = cache.usage()
+    assert usage["pdfpage"]["entries"] < 20
+    # Lookup counters are not cache entries, so eviction never takes them.
+    assert usage["pdfpage"]["misses"] == 1
+    assert cache.volume() <= 2 * 2**20
+    assert cache.get("pdfpage:19") is not None
+    cache.close()
+
+def test_cache_stats_are_uniform_and_exact_under_threads(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = TieredCache(DiskCache(str(tmp_path)), MemoryCache())
+    cache.memory.set("hot", 1)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: (cache.memory.get("hot"), cache.disk.get(f"cold:{i}")), range(2000)))
+    stats = cache.stats()
+    assert stats == {**cache.memory.stats(), **cache.disk.stats()}
+    assert (stats["memory"].hits, stats["disk"].misses) == (2000, 2000)
+    assert stats["memory"].hit_ratio == 1.0
+    cache.close()
@@ -1,4 +1,15 @@
-from docintel.chunking import chunk_text
+import importlib.util
+import random
+from pathlib import Path
+
+from docintel.chunking import Chunk, build_chunks, chunk_text, pack_chunks, pack_windows
+
+def _legacy_chunk_text():
+    path = Path(__file__).resolve().parent.parent / "benchmarks" / "bench_chunking.py"
+    spec = importlib.util.spec_from_file_location("bench_chunking", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod.legacy_chunk_text
 
 def test_chunk_text():
     text = "Hello world. " * 1000
@@ -12,3 +23,51 @@ def test_chunk_overlap_guard():
         assert False
     except ValueError:
         assert True
+
+def test_pack_chunks_and_windows_respect_budget():
+    chunks = build_chunks("d", "One two three. " * 400, chunk_size=200, chunk_overlap=0)
+    count = lambda t: len(t.split())
+    picked = pack_chunks(chunks, count, budget=100, per_chunk_overhead=2)
+    assert picked and sum(count(c.text) + 2 for c in picked) <= 100
+    assert [c.chunk_id for c in picked] == list(range(len(picked)))
+    counted = []
+    exact = pack_chunks(chunks, lambda t: counted.append(t) or 49, budget=100, per_chunk_overhead=1)
+    # Two chunks fill the budget exactly; the rest are never counted.
+    assert len(exact) == 2 and len(counted) == 2
+
+    mixed = [Chunk("d", 0, "a b"), Chunk("d", 1, "x " * 400), Chunk("d", 2, "c d"), Chunk("d", 3, "e f")]
+    counted = []
+    tally = lambda t: counted.append(t) or len(t.split())
+    # The 400-word chunk is ruled out by its length alone and never tokenised.
+    assert [c.chunk_id for c in pack_chunks(mixed, tally, budget=20, per_chunk_overhead=2)] == [0, 2, 3]
+    assert len(counted) == 3
+    counted.clear()
+    # In document order, packing stops at the first chunk that does not fit.
+    assert [c.chunk_id for c in pack_chunks(mixed, tally, budget=20, per_chunk_overhead=2, prefix=True)] == [0]
+    assert len(counted) == 1
+
+    windows = pack_windows(chunks, count, budget=100, per_chunk_overhead=2)
+    assert [c for w in windows for c in w] == chunks
+    assert all(sum(count(c.text) + 2 for c in w) <= 100 for w in windows)
+
+def test_iter_chunks_spans_and_oversized_parts():
+    text = "First sentence here.  Second one!\n\nThird part? " + "x" * 450
+    chunks = build_chunks("d", text, chunk_size=200, chunk_overlap=50)
+    assert [c.text for c in chunks] == chunk_text(text, chunk_size=200, chunk_overlap=50)
+    assert text[chunks[0].start:chunks[0].end] == "First sentence here.  Second one!\n\nThird part?"
+    assert chunks[0].text == "First sentence here. Second one! Third part?"
+    assert all(text[c.start:c.end] in c.text for c in chunks[1:])
+
+def test_iter_chunks_matches_legacy_chunk_text():
+    legacy = _legacy_chunk_text()
+    rng = random.Random(7)
+    pieces = ["Alpha beta gamma.", "Delta!", "Epsilon zeta eta theta?", "\n\n", "  ", "\t", "x" * 180, "word " * 40, "café naïve.", "end.\n"]
+    texts = [
+        "Hello world. " * 300,
+        "y" * 1000,
+        "Short.  Spaced   out!\n\n\nParagraph two? " + "z" * 333 + " tail.",
+        "a  " * 200,
+    ] + ["".join(rng.choice(pieces) + rng.choice(["", " ", "  ", "\n"]) for _ in range(rng.randint(1, 120))) for _ in range(150)]
+    for text in texts:
+        for size, overlap in ((50, 0), (50, 10), (120, 49), (200, 50), (500, 100)):
+            assert chunk_text(text, size, overlap) == legacy(text, size, overlap), (text[:60], size, overlap)
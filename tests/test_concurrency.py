@@ -0,0 +1,167 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from openai import AsyncOpenAI
+
+from docintel.concurrency import AdaptiveConcurrency, HedgePolicy, is_transient, retry_after_s
+from docintel.llm import AsyncLLMClient
+
+class _Throttled(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        self.response = type("R", (), {"headers": {"retry-after": retry_after}})()
+
+async def _stub_server(capacity: int, state: dict):
+    # Minimal OpenAI-compatible endpoint that answers 429 once more than `capacity` calls overlap.
+    async def handle(reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = next(
+            int(line.split(b":", 1)[1]) for line in head.split(b"\r\n") if line.lower().startswith(b"content-length")
+        )
+        await reader.readexactly(length)
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            if state["in_flight"] > capacity:
+                state["throttled"] += 1
+                status, body, extra = "429 Too Many Requests", {"error": {"message": "slow down"}}, "retry-after: 0.05\r\n"
+            else:
+                await asyncio.sleep(0.02)
+                state["ok"] += 1
+                status, extra = "200 OK", ""
+                body = {
+                    "id": "c", "object": "chat.completion", "created": 0, "model": "stub",
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "{}"}}],
+                }
+        finally:
+            state["in_flight"] -= 1
+        raw = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status}\r\ncontent-type: application/json\r\ncontent-length: {len(raw)}\r\n{extra}connection: close\r\n\r\n".encode()
+            + raw
+        )
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+def test_retry_after_parsing():
+    assert retry_after_s(_Throttled("2")) == 2.0
+    assert retry_after_s(_Throttled("soon")) is None
+    assert retry_after_s(ValueError("x")) is None
+
+def test_only_transient_errors_are_retried():
+    class _Status(Exception):
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    assert is_transient(_Throttled("0")) and is_transient(_Status(502)) and is_transient(ConnectionResetError())
+    assert not any(is_transient(e) for e in (_Status(400), _Status(401), _Status(404), _Status(422), ValueError("bad json")))
+
+    calls = {"n": 0}
+
+    class _Completions:
+        async def create(self, **kwargs):
+            calls["n"] += 1
+            raise _Status(400)
+
+    llm = AsyncLLMClient(SimpleNamespace(chat=SimpleNamespace(completions=_Completions())), "gpt-4o-mini", None, None, max_retries=5, timeout_s=10)
+    try:
+        asyncio.run(llm.complete([{"role": "user", "content": "x"}]))
+        assert False
+    except _Status:
+        pass
+    assert calls["n"] == 1
+
+def test_adaptive_concurrency_backs_off_under_throttling():
+    state = {"in_flight": 0, "peak": 0, "throttled": 0, "ok": 0}
+
+    async def _run():
+        server = await _stub_server(capacity=3, state=state)
+        port = server.sockets[0].getsockname()[1]
+        client = AsyncOpenAI(api_key="test", base_url=f"http://127.0.0.1:{port}/v1", max_retries=0)
+        ctl = AdaptiveConcurrency(initial=12, max_limit=16)
+        llm = AsyncLLMClient(client, "gpt-4o-mini", None, None, max_retries=10, timeout_s=10, concurrency=ctl)
+        async with server:
+            results = await asyncio.gather(
+                *(llm.complete([{"role": "user", "content": f"doc {i}"}]) for i in range(60))
+            )
+        await client.close()
+        return results, ctl
+
+    results, ctl = asyncio.run(_run())
+    assert len(results) == 60 and all(text == "{}" for text, _, _ in results)
+    assert state["ok"] == 60
+    assert ctl.throttled > 0 and ctl.cuts > 0
+    assert ctl.limit < 12
+    assert ctl.in_flight == 0
+
+def test_adaptive_concurrency_grows_when_healthy_and_honors_retry_after():
+    ctl = AdaptiveConcurrency(initial=2, max_limit=4)
+
+    async def _ok():
+        async with ctl.slot():
+            await asyncio.sleep(0)
+
+    async def _throttled():
+        try:
+            async with ctl.slot():
+                raise _Throttled("0.2")
+        except _Throttled:
+            pass
+
+    async def _run():
+        for _ in range(20):
+            await _ok()
+        grown = ctl.limit
+        await _throttled()
+        t0 = time.monotonic()
+        await _ok()
+        return grown, time.monotonic() - t0
+
+    grown, waited = asyncio.run(_run())
+    assert grown == 4
+    assert ctl.limit == 2
+    assert waited >= 0.15
+
+def test_hedged_request_wins_over_slow_primary_and_respects_budget():
+    calls = {"n": 0, "cancelled": 0}
+
+    class _Completions:
+        async def create(self, **kwargs):
+            calls["n"] += 1
+            delay = 2.0 if calls["n"] % 2 else 0.01
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                calls["cancelled"] += 1
+                raise
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="{}"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=_Completions()))
+    policy = HedgePolicy(percentile=0.9, budget=1.0, min_samples=5)
+    for _ in range(5):
+        policy.record(0.02)
+    llm = AsyncLLMClient(client, "gpt-4o-mini", None, None, max_retries=1, timeout_s=10, hedging=policy)
+
+    async def _run():
+        t0 = time.monotonic()
+        _, usage, _ = await llm.complete([{"role": "user", "content": "hedge me"}])
+        return usage, time.monotonic() - t0
+
+    usage, elapsed = asyncio.run(_run())
+    assert elapsed < 1.0
+    assert usage.hedged_requests == 1
+    assert usage.prompt_tokens > 0 and usage.prompt_tokens % 2 == 0
+    assert calls == {"n": 2, "cancelled": 1}
+    assert policy.fired == 1 and policy.won == 1
+    # The credit earned by this call is spent.
+    assert policy.try_hedge() is False
+
+    never = HedgePolicy(budget=0.0)
+    for _ in range(100):
+        never.start_call()
+    assert never.try_hedge() is False
@@ -0,0 +1,88 @@
+import json
+
+from docintel.cache import DiskCache
+from docintel.config import DISettings
+from docintel.extractor import SchemaExtractor
+from docintel.schemas import ContractSchema
+
+class CountingLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, messages):
+        self.calls += 1
+        return json.dumps({"counterparty": "Alpha Widgets"})
+
+def test_extraction_result_cache_hit(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    llm = CountingLLM()
+    ext = SchemaExtractor(llm, DISettings(), cache=cache)
+
+    first = ext.extract_sync("contract", ContractSchema, "a.txt", "Agreement with Alpha Widgets.")
+    second = ext.extract_sync("contract", ContractSchema, "b.txt", "Agreement with Alpha Widgets.")
+    assert llm.calls == 1
+    assert second.data == first.data
+    assert second.doc_id == "b.txt"
+
+    ext.extract_sync("contract", ContractSchema, "a.txt", "Agreement with Beta Corp.")
+    assert llm.calls == 2
+
+    other = SchemaExtractor(llm, DISettings(chunk_size=800), cache=cache)
+    other.extract_sync("contract", ContractSchema, "a.txt", "Agreement with Alpha Widgets.")
+    assert llm.calls == 3
+    cache.close()
+
+def test_sync_and_async_extractors_share_result_entries(tmp_path):
+    import asyncio
+
+    from docintel.extractor import AsyncSchemaExtractor
+    from docintel.metrics import Usage
+
+    class AsyncLLM:
+        def __init__(self):
+            self.calls = 0
+
+        async def complete(self, messages):
+            self.calls += 1
+            return json.dumps({"counterparty": "Alpha Widgets"}), Usage(prompt_tokens=5, completion_tokens=1), 0.001
+
+    cache = DiskCache(str(tmp_path))
+    allm, llm = AsyncLLM(), CountingLLM()
+    res, usage, _ = asyncio.run(AsyncSchemaExtractor(allm, DISettings(), cache=cache).extract("contract", ContractSchema, "a", "Doc one."))
+    assert SchemaExtractor(llm, DISettings(), cache=cache).extract_sync("contract", ContractSchema, "a", "Doc one.").data == res.data
+
+    SchemaExtractor(llm, DISettings(), cache=cache).extract_sync("contract", ContractSchema, "b", "Doc two.")
+    res2, usage2, _ = asyncio.run(AsyncSchemaExtractor(allm, DISettings(), cache=cache).extract("contract", ContractSchema, "b", "Doc two."))
+    assert llm.calls == 1 and allm.calls == 1
+    assert res2.data["counterparty"] == "Alpha Widgets" and usage2.total_tokens == 0
+    # Entries the async extractor wrote report no spend on a hit either.
+    _, usage3, cost3 = asyncio.run(AsyncSchemaExtractor(allm, DISettings(), cache=cache).extract("contract", ContractSchema, "a", "Doc one."))
+    assert usage.total_tokens > 0 and usage3.total_tokens == 0 and cost3 == 0.0
+    cache.close()
+
+def test_sync_and_async_extractors_share_window_entries(tmp_path):
+    import asyncio
+
+    from docintel.extractor import AsyncSchemaExtractor
+    from docintel.metrics import Usage
+
+    class AsyncLLM:
+        def __init__(self):
+            self.calls = 0
+
+        async def complete(self, messages):
+            self.calls += 1
+            return json.dumps({"counterparty": "Alpha Widgets"}), Usage(prompt_tokens=5, completion_tokens=1), 0.001
+
+    text = "".join(f"Filler sentence number {i} with some words in it. " for i in range(200))
+    s = DISettings(chunk_size=300, chunk_overlap=0, max_chunks_per_call=4, extraction_mode="map_reduce")
+    cache = DiskCache(str(tmp_path))
+    llm, allm = CountingLLM(), AsyncLLM()
+    SchemaExtractor(llm, s, cache=cache).extract_sync("contract", ContractSchema, "a", text)
+    assert llm.calls > 1
+    # Drop the whole-document entry so the async run has to go through the windows.
+    cache.prune(prefix="extract")
+    res, usage, _ = asyncio.run(AsyncSchemaExtractor(allm, s, cache=cache).extract("contract", ContractSchema, "a", text))
+    assert allm.calls == 0
+    assert res.data["counterparty"] == "Alpha Widgets" and usage.total_tokens == 0
+    cache.close()
@@ -0,0 +1,52 @@
+import json
+
+from docintel.config import DISettings
+from docintel.extractor import SchemaExtractor
+from docintel.schemas import InvoiceSchema
+
+class ScriptedLLM:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def complete(self, messages):
+        self.prompts.append(messages)
+        return self.replies.pop(0)
+
+def test_invalid_field_is_reasked_without_the_document():
+    doc = "Invoice INV-7 from ACME. " * 50
+    llm = ScriptedLLM(
+        '```json\n{"vendor": "ACME", "invoice_number": "INV-7", "line_items": "widgets, bolts",}\n```',
+        '{"line_items": ["widgets", "bolts"]}',
+    )
+    ext = SchemaExtractor(llm, DISettings(enable_cache=False))
+    res = ext.extract_sync("invoice", InvoiceSchema, "inv.txt", doc)
+
+    assert res.data["line_items"] == ["widgets", "bolts"]
+    assert res.data["vendor"] == "ACME"
+    assert res.confidence == 0.8
+    assert ext.repairs.field_repairs == 1 and ext.repairs.full_repairs == 0
+    reask = json.loads(llm.prompts[1][-1]["content"])
+    assert list(reask["fields"]) == ["line_items"]
+    assert "Invoice INV-7 from ACME." not in llm.prompts[1][-1]["content"]
+    assert sum(len(m["content"]) for m in llm.prompts[1]) < sum(len(m["content"]) for m in llm.prompts[0]) / 2
+
+def test_unparseable_output_falls_back_to_full_reask():
+    llm = ScriptedLLM("I could not find anything.", '{"vendor": "ACME"}')
+    ext = SchemaExtractor(llm, DISettings(enable_cache=False))
+    res = ext.extract_sync("invoice", InvoiceSchema, "inv.txt", "Invoice from ACME.")
+
+    assert res.data["vendor"] == "ACME" and res.confidence == 0.75
+    assert ext.repairs.full_repairs == 1
+    assert ext.repairs.repair_call_rate == 1.0
+
+def test_repair_stats_count_exactly_across_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from docintel.extractor import RepairStats
+
+    stats = RepairStats()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: (stats.record("calls"), stats.record("full_repairs")), range(5000)))
+    assert (stats.calls, stats.full_repairs, stats.field_repairs) == (5000, 5000, 0)
+    assert stats.repair_call_rate == 1.0
@@ -0,0 +1,96 @@
+from pypdf import PdfReader
+
+from docintel import ingest
+from docintel.cache import DiskCache
+from docintel.ingest import _page_cache_key, iter_pdf_pages, read_pdf
+
+def _write_pdf(path, page_texts, font="Helvetica"):
+    objs = ["<< /Type /Catalog /Pages 2 0 R >>", None, f"<< /Type /Font /Subtype /Type1 /BaseFont /{font} >>"]
+    kids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objs.append(f"<< /Length {len(stream)} >>\nstream\n{stream.decode()}\nendstream")
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objs)} 0 R >>")
+        kids.append(f"{len(objs)} 0 R")
+    objs[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, body in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(out)
+
+def test_pdf_pages_parallel_and_cached(tmp_path):
+    pages = [f"Page number {i} text" for i in range(12)]
+    pdf = tmp_path / "doc.pdf"
+    _write_pdf(pdf, pages)
+
+    serial = list(iter_pdf_pages(pdf, workers=1))
+    parallel = list(iter_pdf_pages(pdf, workers=2, pages_per_task=3))
+    pool = ingest._pool
+    assert serial == parallel
+    # Later documents reuse the same worker processes.
+    assert list(iter_pdf_pages(pdf, workers=2, pages_per_task=3)) == serial and ingest._pool is pool
+    assert [p.strip() for p in serial] == pages
+
+    cache = DiskCache(str(tmp_path / "cache"))
+    assert read_pdf(pdf, cache=cache, workers=2, pages_per_task=3) == read_pdf(pdf, workers=1)
+    misses = cache.stats()["disk"].misses
+
+    pages[5] = "Amended page five"
+    _write_pdf(pdf, pages)
+    text = read_pdf(pdf, cache=cache, workers=1)
+    assert "Amended page five" in text
+    assert cache.stats()["disk"].misses == misses + 1
+    cache.close()
+
+def test_pdf_page_keys_are_computed_per_batch(tmp_path, monkeypatch):
+    pdf = tmp_path / "doc.pdf"
+    _write_pdf(pdf, [f"Page {i}" for i in range(12)])
+    hashed = []
+    key = ingest._page_cache_key
+    monkeypatch.setattr(ingest, "_page_cache_key", lambda page, memo: hashed.append(1) or key(page, memo))
+
+    cache = DiskCache(str(tmp_path / "cache"))
+    pages = iter_pdf_pages(pdf, cache=cache, workers=1, pages_per_task=3)
+    assert next(pages).strip() == "Page 0"
+    assert len(hashed) == 3
+    assert len(list(pages)) == 11 and len(hashed) == 12
+    cache.close()
+
+def test_in_memory_pdf_spool_is_removed_after_read(tmp_path):
+    pages = [f"Upload page {i}" for i in range(12)]
+    pdf = tmp_path / "doc.pdf"
+    _write_pdf(pdf, pages)
+    spool = tmp_path / "_uploads"
+
+    with pdf.open("rb") as stream:
+        text = read_pdf(stream, workers=2, pages_per_task=3, spool_dir=spool)
+    assert text == read_pdf(pdf, workers=1)
+    assert list(spool.iterdir()) == []
+
+    with pdf.open("rb") as stream:
+        pages_iter = iter_pdf_pages(stream, workers=2, pages_per_task=3, spool_dir=spool)
+        next(pages_iter)
+        assert len(list(spool.iterdir())) == 1
+        pages_iter.close()
+    assert list(spool.iterdir()) == []
+
+def test_page_cache_key_covers_resources(tmp_path):
+    plain, mono = tmp_path / "plain.pdf", tmp_path / "mono.pdf"
+    _write_pdf(plain, ["Same text", "Same text"])
+    _write_pdf(mono, ["Same text", "Same text"], font="Courier")
+
+    def _keys(path):
+        memo = {}
+        return [_page_cache_key(p, memo) for p in PdfReader(str(path)).pages]
+
+    a, b = _keys(plain), _keys(mono)
+    # Identical content streams drawn with different fonts do not share an entry.
+    assert a[0] == a[1] and b[0] == b[1]
+    assert a[0] != b[0]
+    assert _keys(plain) == a
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from docintel.jobs import JobRunner, JobStore
+
+def test_job_store_survives_restart(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3", lease_s=0.05)
+    job_id = store.create("contract", [{"raw_text": "a"}, {"raw_text": "b"}])
+    claimed = store.claim()
+    assert claimed[:3] == (job_id, 0, "contract")
+    store.close()
+
+    # The first process is gone and its lease runs out.
+    time.sleep(0.1)
+    reopened = JobStore(tmp_path / "jobs.sqlite3")
+    assert reopened.status(job_id).running == 1
+    assert reopened.requeue_expired() == 1
+    assert reopened.claim()[1] == 0
+    assert reopened.finish(job_id, 0, {"x": 1})
+    assert reopened.finish(*reopened.claim()[:2], error="boom")
+    st = reopened.status(job_id)
+    assert (st.done, st.failed, st.state) == (1, 1, "completed")
+    assert reopened.claim() is None
+    reopened.close()
+
+def test_live_leases_are_not_taken_over(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    a, b = JobStore(path, lease_s=0.2), JobStore(path, lease_s=0.2)
+    job_id = a.create("contract", [{"raw_text": "a"}, {"raw_text": "b"}])
+    assert a.claim()[1] == 0
+    # Another worker process starting up leaves a's item alone and takes the next one.
+    assert b.requeue_expired() == 0
+    assert b.claim()[1] == 1
+    assert b.claim() is None
+    assert b.finish(job_id, 1, {"from": "b"})
+
+    for _ in range(3):
+        time.sleep(0.1)
+        assert a.renew() == 1
+    assert b.claim() is None
+
+    # a stops renewing (it hangs or dies); b takes the item over and a's late result is discarded.
+    time.sleep(0.3)
+    assert b.claim()[1] == 0
+    assert not a.finish(job_id, 0, {"from": "a"})
+    assert b.finish(job_id, 0, {"from": "b"})
+    assert b.results_page(job_id, -1)[0][2] == '{"from": "b"}'
+    a.close()
+    b.close()
+
+def test_runner_processes_each_item_once_across_processes(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    seen = []
+
+    async def _process(schema, request):
+        seen.append(request["n"])
+        await asyncio.sleep(0.01)
+        return {"n": request["n"]}
+
+    async def _run():
+        stores = [JobStore(path, lease_s=5.0) for _ in range(2)]
+        job_id = stores[0].create("contract", [{"n": i} for i in range(20)])
+        runners = [JobRunner(s, _process, concurrency=3) for s in stores]
+        # Both "workers" start lazily, as they would on their first /jobs request.
+        for r in runners:
+            r.start()
+        while stores[0].status(job_id).state != "completed":
+            await asyncio.sleep(0.01)
+        for r in runners:
+            await r.stop()
+        for s in stores:
+            s.close()
+
+    asyncio.run(_run())
+    assert sorted(seen) == list(range(20))
@@ -5,3 +5,13 @@ def test_extract_json_object():
     obj = extract_json_object(s)
     assert obj["a"] == 1
     assert obj["b"] == [2,3]
+
+def test_extract_json_object_repairs_common_llm_damage():
+    fenced = 'Sure:\n```json\n{"a": 1, "b": [1, 2,],}\n```\nLet me know {if} you need more.'
+    assert extract_json_object(fenced) == {"a": 1, "b": [1, 2]}
+    assert extract_json_object("{'vendor': 'ACME', 'total': None, paid: True}") == {"vendor": "ACME", "total": None, "paid": True}
+    assert extract_json_object('{"a": "x"} then {"b": 2}') == {"a": "x"}
+
+def test_extract_json_object_closes_truncated_output():
+    assert extract_json_object('{"counterparty": "X", "obligations": ["pay", "deliv') == {"counterparty": "X", "obligations": ["pay"]}
+    assert extract_json_object('{"a": {"b": 1, "c": ') == {"a": {"b": 1, "c": None}}
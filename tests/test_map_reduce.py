@@ -0,0 +1,48 @@
+import json
+
+from docintel.config import DISettings
+from docintel.extractor import SchemaExtractor
+from docintel.postprocess import merge_partials
+from docintel.schemas import ContractSchema
+
+def test_merge_partials_rules():
+    merged = merge_partials(ContractSchema, [
+        {"counterparty": None, "governing_law": "", "obligations": ["Deliver widgets", "Pay fees"]},
+        {"counterparty": "Alpha Widgets", "governing_law": "Ontario", "obligations": ["pay  fees", "Keep records"]},
+        {"counterparty": "Other", "obligations": None},
+    ])
+    assert merged["counterparty"] == "Alpha Widgets"
+    assert merged["governing_law"] == "Ontario"
+    assert merged["obligations"] == ["Deliver widgets", "Pay fees", "Keep records"]
+    assert merged["end_date"] is None
+
+class WindowLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, messages):
+        self.calls += 1
+        doc = messages[-1]["content"]
+        out = {"obligations": []}
+        if "Governing law is Ontario" in doc:
+            out["governing_law"] = "Ontario"
+        if "Counterparty is Alpha" in doc:
+            out["counterparty"] = "Alpha"
+            out["obligations"] = ["Deliver"]
+        return json.dumps(out)
+
+def test_map_reduce_sees_late_chunks():
+    filler = "Filler sentence number {} with some words in it. "
+    text = "Counterparty is Alpha. " + "".join(filler.format(i) for i in range(400)) + "Governing law is Ontario."
+    s = DISettings(chunk_size=300, chunk_overlap=0, max_chunks_per_call=4, map_concurrency=3)
+
+    first = SchemaExtractor(WindowLLM(), s).extract_sync("contract", ContractSchema, "c", text)
+    assert first.data["governing_law"] is None
+
+    llm = WindowLLM()
+    res = SchemaExtractor(llm, s.model_copy(update={"extraction_mode": "map_reduce"})).extract_sync("contract", ContractSchema, "c", text)
+    assert res.data["counterparty"] == "Alpha"
+    assert res.data["governing_law"] == "Ontario"
+    assert res.data["obligations"] == ["Deliver"]
+    assert llm.calls > 1
+    assert res.used_chunks > 4
@@ -0,0 +1,23 @@
+import json
+
+from docintel.hashing import sha256_messages
+from docintel.prompts import build_extraction_messages, compile_prompt
+from docintel.schemas import ContractSchema, InvoiceSchema
+
+def test_prompt_prefix_is_stable_across_documents():
+    a = build_extraction_messages(ContractSchema, 'He said "hi"\nbye', "a.txt", chunk_hint="hint")
+    b = build_extraction_messages(ContractSchema, "other", "b.txt")
+    assert a[0] == b[0]
+    assert '"counterparty"' in a[0]["content"]
+    assert compile_prompt(ContractSchema) is compile_prompt(ContractSchema)
+    assert a[0] != build_extraction_messages(InvoiceSchema, "other", "b.txt")[0]
+
+    user = json.loads(a[1]["content"])
+    assert user == {"task": "extract", "doc_id": "a.txt", "hint": "hint", "document": 'He said "hi"\nbye'}
+    assert list(user)[-1] == "document"
+
+def test_sha256_messages_distinguishes_boundaries():
+    m1 = [{"role": "user", "content": "ab"}, {"role": "user", "content": "c"}]
+    m2 = [{"role": "user", "content": "a"}, {"role": "user", "content": "bc"}]
+    assert sha256_messages("m", m1) != sha256_messages("m", m2)
+    assert sha256_messages("m", m1) == sha256_messages("m", list(m1))
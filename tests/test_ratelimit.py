@@ -0,0 +1,99 @@
+import asyncio
+import multiprocessing as mp
+import time
+from types import SimpleNamespace
+
+from docintel.llm import AsyncLLMClient
+from docintel.ratelimit import SharedTokenBucket, TokenBucket, TokenBudget
+
+def _hammer(path, deadline, out):
+    bucket = SharedTokenBucket(path, "llm", rate=20.0, capacity=1.0)
+    n = 0
+    while True:
+        bucket.acquire_sync()
+        if time.time() >= deadline:
+            break
+        n += 1
+    bucket.close()
+    out.put(n)
+
+def test_shared_bucket_limits_aggregate_rate_across_processes(tmp_path):
+    path = tmp_path / "ratelimit.sqlite3"
+    SharedTokenBucket(path, "llm", rate=20.0, capacity=1.0).close()
+    ctx = mp.get_context("fork")
+    out = ctx.Queue()
+    duration = 1.5
+    deadline = time.time() + duration
+    procs = [ctx.Process(target=_hammer, args=(path, deadline, out)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    counts = [out.get(timeout=30) for _ in procs]
+    for p in procs:
+        p.join()
+    total = sum(counts)
+    assert total <= 20.0 * duration + 1 + 2
+    assert total >= 20.0 * duration * 0.5
+    assert sum(1 for c in counts if c > 0) >= 2
+
+def test_token_budget_reserves_estimate_and_reconciles():
+    tokens = TokenBucket(rate=1000.0, capacity=1000.0)
+    budget = TokenBudget(None, tokens, expected_completion_tokens=200)
+
+    async def _run():
+        reserved = await budget.acquire(700)
+        await budget.reconcile(reserved, 300)
+        t0 = time.monotonic()
+        await budget.acquire(400)
+        quick = time.monotonic() - t0
+        t0 = time.monotonic()
+        await budget.acquire(400)
+        return reserved, quick, time.monotonic() - t0
+
+    reserved, quick, slow = asyncio.run(_run())
+    assert reserved == 900
+    assert quick < 0.05
+    assert slow >= 0.35
+
+def test_async_llm_client_reconciles_against_reported_usage():
+    class _Completions:
+        async def create(self, **kwargs):
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="{}"))],
+                usage=SimpleNamespace(total_tokens=10),
+            )
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=_Completions()))
+    tokens = TokenBucket(rate=0.001, capacity=5000.0)
+    llm = AsyncLLMClient(client, "gpt-4o-mini", None, None, max_retries=1, timeout_s=10,
+                         budget=TokenBudget(None, tokens, expected_completion_tokens=2000))
+    asyncio.run(llm.complete([{"role": "user", "content": "hello"}]))
+    assert tokens.try_acquire(4980) == 0
+
+def test_failed_calls_refund_only_rejected_requests():
+    class _Failure(Exception):
+        def __init__(self, status_code=None):
+            self.status_code = status_code
+
+    def _llm(exc, tokens):
+        class _Completions:
+            async def create(self, **kwargs):
+                raise exc
+
+        return AsyncLLMClient(SimpleNamespace(chat=SimpleNamespace(completions=_Completions())), "gpt-4o-mini", None, None,
+                              max_retries=1, timeout_s=10, budget=TokenBudget(None, tokens, expected_completion_tokens=2000))
+
+    async def _consume(gen):
+        return [x async for x in gen]
+
+    # (failure, refunded?) for complete() and stream() alike.
+    for exc, refunded in ((_Failure(429), True), (TimeoutError(), False), (_Failure(500), False), (_Failure(400), False)):
+        for call in ("complete", "stream"):
+            tokens = TokenBucket(rate=0.001, capacity=5000.0)
+            llm = _llm(exc, tokens)
+            messages = [{"role": "user", "content": "hello"}]
+            try:
+                asyncio.run(llm.complete(messages) if call == "complete" else _consume(llm.stream(messages)))
+                assert False
+            except type(exc):
+                pass
+            assert (tokens.try_acquire(4900) == 0) is refunded, (exc, call)
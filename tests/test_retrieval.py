@@ -0,0 +1,28 @@
+from docintel.chunking import build_chunks
+from docintel.retrieval import BM25Index, rank_chunks, schema_query
+from docintel.schemas import ContractSchema
+
+def test_schema_query_uses_field_names_and_descriptions():
+    q = schema_query(ContractSchema)
+    assert "governing" in q and "law" in q and "jurisdiction" in q
+    assert "schema" not in q and "the" not in q
+    # "(ISO preferred)" is a formatting note for the model, not document vocabulary.
+    assert "iso" not in q and "preferred" not in q and "name" in q
+
+def test_bm25_ranks_matching_chunk_first():
+    idx = BM25Index(["the cat sat", "Payment terms are net-30.", "weather report"], vocabulary=["payment", "terms", "net"])
+    assert idx.top_k(["payment", "terms"], 1) == [1]
+
+def test_bm25_normalises_each_chunk_on_unicode_words():
+    idx = BM25Index(["Le café du coin", "cafe_net\x00 net net", "caf"], vocabulary=["café", "caf", "net"])
+    assert idx._tfs == [{"café": 1}, {"net": 3}, {"caf": 1}]
+    assert idx._lens == [4, 4, 1]
+
+def test_rank_chunks_keeps_first_chunk_then_relevance():
+    filler = "".join(f"Unrelated filler sentence {i} about weather and sports. " for i in range(300))
+    text = "Master agreement preamble. " + filler + "This agreement is governed by the law of Ontario jurisdiction. " + filler
+    chunks = build_chunks("d", text, chunk_size=300, chunk_overlap=0)
+    ranked = rank_chunks(chunks, ContractSchema)
+    assert sorted(c.chunk_id for c in ranked) == [c.chunk_id for c in chunks]
+    assert ranked[0].chunk_id == 0
+    assert "Ontario" in ranked[1].text
@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from docintel import api
+
+SRC = str(Path(__file__).resolve().parent.parent / "src")
+
+def test_cli_import_defers_heavy_dependencies():
+    code = (
+        "import sys, json, docintel.cli; "
+        "print(json.dumps([m for m in ('openai', 'tiktoken', 'pypdf', 'pydantic_settings', "
+        "'opentelemetry.sdk', 'opentelemetry.exporter') if m in sys.modules]))"
+    )
+    env = dict(os.environ, PYTHONPATH=SRC)
+    out = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True).stdout
+    assert json.loads(out) == []
+
+def test_lifespan_warms_up_before_serving(tmp_path, monkeypatch):
+    monkeypatch.setenv("DI_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("DI_LLM_BACKEND", "stub")
+    monkeypatch.setattr(api, "configure_tracing", lambda cfg: None)
+    api._state.clear()
+    try:
+        with TestClient(api.app) as client:
+            assert api._state["warmup_s"] > 0
+            health = client.get("/health").json()
+    finally:
+        api._state.clear()
+
+    assert health["status"] == "ok" and health["warmed_up"] is True
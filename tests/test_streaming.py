@@ -0,0 +1,113 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from docintel import api
+from docintel.config import DISettings
+from docintel.extractor import AsyncSchemaExtractor
+from docintel.llm import AsyncLLMClient
+from docintel.postprocess import IncrementalFields
+
+REPLY = '```json\n{"counterparty": "Alpha, {Widgets}", "obligations": ["deliver", "pay"], "governing_law": "Ontario"}\n```'
+
+class _Stream:
+    def __init__(self, text, step=7):
+        self._parts = [text[i:i + step] for i in range(0, len(text), step)]
+        self.closed = False
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for p in self._parts:
+            await asyncio.sleep(0)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=p))], usage=None)
+
+    async def close(self):
+        self.closed = True
+
+class StubStreamingClient:
+    def __init__(self, text):
+        self.text = text
+        self.streams = []
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        assert kwargs.get("stream") is True
+        s = _Stream(self.text)
+        self.streams.append(s)
+        return s
+
+def test_incremental_fields_emit_as_members_complete():
+    parser = IncrementalFields()
+    seen = []
+    for i, ch in enumerate(REPLY):
+        for name, value in parser.feed(ch):
+            seen.append((name, value, i))
+    assert [(n, v) for n, v, _ in seen] == [
+        ("counterparty", "Alpha, {Widgets}"),
+        ("obligations", ["deliver", "pay"]),
+        ("governing_law", "Ontario"),
+    ]
+    assert seen[0][2] < REPLY.index("obligations")
+    assert parser.done
+
+def test_stream_endpoint_emits_fields_then_validated_result():
+    client = StubStreamingClient(REPLY)
+    llm = AsyncLLMClient(client, "gpt-4o-mini", None, None, max_retries=1, timeout_s=10)
+    api._state.clear()
+    api._state.update({"s": DISettings(enable_cache=False), "cache": None, "aext": AsyncSchemaExtractor(llm, DISettings(enable_cache=False))})
+    try:
+        r = TestClient(api.app).post("/extract/stream", json={"schema": "contract", "raw_text": "Agreement with Alpha Widgets.", "doc_id": "c1"})
+    finally:
+        api._state.clear()
+
+    assert r.status_code == 200
+    events = [json.loads(line) for line in r.text.splitlines()]
+    assert [e["event"] for e in events] == ["field", "field", "field", "result"]
+    assert events[0] == {"event": "field", "name": "counterparty", "value": "Alpha, {Widgets}"}
+    result = events[-1]["result"]
+    assert result["doc_id"] == "c1"
+    assert result["data"]["obligations"] == ["deliver", "pay"]
+    assert result["completion_tokens_est"] > 0
+
+def test_stream_closes_upstream_when_consumer_stops():
+    client = StubStreamingClient(REPLY)
+    llm = AsyncLLMClient(client, "gpt-4o-mini", None, None, max_retries=1, timeout_s=10)
+
+    async def _run():
+        gen = llm.stream([{"role": "user", "content": "x"}])
+        first = await gen.__anext__()
+        await gen.aclose()
+        return first
+
+    first = asyncio.run(_run())
+    assert first[0] == REPLY[:7] and first[1] is None
+    assert client.streams[0].closed
+
+def test_stream_replays_entries_written_by_the_sync_extractor(tmp_path):
+    from docintel.cache import DiskCache
+    from docintel.extractor import SchemaExtractor
+    from docintel.schemas import ContractSchema
+
+    class SyncLLM:
+        def complete(self, messages):
+            return REPLY
+
+    cache = DiskCache(str(tmp_path))
+    text = "Agreement with Alpha Widgets."
+    SchemaExtractor(SyncLLM(), DISettings(), cache=cache).extract_sync("contract", ContractSchema, "a", text)
+    client = StubStreamingClient(REPLY)
+    aext = AsyncSchemaExtractor(AsyncLLMClient(client, "gpt-4o-mini", None, None, max_retries=1, timeout_s=10), DISettings(), cache=cache)
+
+    async def _run():
+        return [e async for e in aext.extract_stream("contract", ContractSchema, "b", text)]
+
+    events = asyncio.run(_run())
+    cache.close()
+    assert not client.streams
+    res, usage, cost = events[-1][1]
+    assert res.doc_id == "b" and res.data["governing_law"] == "Ontario"
+    assert usage.total_tokens == 0 and cost == 0.0
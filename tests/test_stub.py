@@ -0,0 +1,58 @@
+import asyncio
+
+import openai
+import pytest
+
+from docintel.concurrency import retry_after_s
+from docintel.config import DISettings
+from docintel.extractor import AsyncSchemaExtractor, SchemaExtractor
+from docintel.llm import AsyncLLMClient, LLMClient, build_async_openai_client
+from docintel.schemas import SCHEMA_REGISTRY
+from docintel.stub import StubAsyncOpenAI, StubConfig, StubOpenAI
+
+def test_stub_backend_is_selected_from_settings():
+    client = build_async_openai_client(DISettings(llm_backend="stub", stub_latency_ms=0))
+    assert isinstance(client, StubAsyncOpenAI)
+
+@pytest.mark.parametrize("schema", sorted(SCHEMA_REGISTRY))
+def test_stub_outputs_are_deterministic_and_valid(schema):
+    model = SCHEMA_REGISTRY[schema]
+    s = DISettings(enable_cache=False)
+
+    async def _run():
+        llm = AsyncLLMClient(StubAsyncOpenAI(StubConfig(latency_ms=0)), s.llm_model, None, None, 1, 10)
+        ext = AsyncSchemaExtractor(llm, s)
+        a, usage, _ = await ext.extract(schema, model, "d1", "Some document text.")
+        b, _, _ = await ext.extract(schema, model, "d1", "Some document text.")
+        return a, b, usage, ext
+
+    a, b, usage, ext = asyncio.run(_run())
+    assert a.data == b.data and a.confidence == 0.85
+    assert ext.repairs.field_repairs == ext.repairs.full_repairs == 0
+    assert usage.prompt_tokens > 0
+
+    sync = SchemaExtractor(LLMClient(StubOpenAI(StubConfig(latency_ms=0)), s.llm_model, None, None, 1, 10), s)
+    assert sync.extract_sync(schema, model, "d1", "Some document text.").data == a.data
+
+def test_stub_injects_throttling_with_retry_after():
+    client = StubAsyncOpenAI(StubConfig(latency_ms=0, throttle_rate=1.0, retry_after_s=0.5))
+
+    async def _run():
+        await client.chat.completions.create(model="m", messages=[{"role": "user", "content": "x"}])
+
+    with pytest.raises(openai.RateLimitError) as exc:
+        asyncio.run(_run())
+    assert retry_after_s(exc.value) == 0.5
+
+def test_stub_streams_deltas():
+    llm = AsyncLLMClient(StubAsyncOpenAI(StubConfig(latency_ms=5, stream_chunk_chars=4)), "gpt-4o-mini", None, None, 1, 10)
+    messages = [{"role": "system", "content": 'x\n\nJSON schema:\n{"properties": {"a": {"type": "string"}}}'}, {"role": "user", "content": "doc"}]
+
+    async def _run():
+        return [item async for item in llm.stream(messages)]
+
+    items = asyncio.run(_run())
+    text = "".join(d for d, u, _ in items if u is None)
+    assert len(items) > 3
+    assert text.startswith('{"a": "a ')
+    assert items[-1][1].completion_tokens > 0
@@ -0,0 +1,120 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from docintel import api
+from docintel.cache import DiskCache, MemoryCache, TieredCache
+from docintel.config import DISettings
+from docintel.extractor import AsyncSchemaExtractor
+from docintel.llm import AsyncLLMClient
+from docintel.stub import StubAsyncOpenAI, StubConfig
+from docintel.telemetry import LLM_RETRIES, Histogram, Registry, traced
+
+def _sample(text: str, name: str, labels: str = "") -> float:
+    m = re.search(rf"^{re.escape(name + labels)} (\S+)$", text, re.MULTILINE)
+    assert m, f"{name}{labels} missing"
+    return float(m.group(1))
+
+def test_histogram_renders_cumulative_buckets():
+    reg = Registry()
+    h = reg.register(Histogram("t_seconds", "Test.", ["stage"], buckets=(0.1, 1.0)))
+    for v in (0.05, 0.5, 0.5, 3.0):
+        h.labels("a").observe(v)
+    out = reg.render()
+    assert "# TYPE t_seconds histogram" in out
+    assert _sample(out, "t_seconds_bucket", '{stage="a",le="0.1"}') == 1
+    assert _sample(out, "t_seconds_bucket", '{stage="a",le="1"}') == 3
+    assert _sample(out, "t_seconds_bucket", '{stage="a",le="+Inf"}') == 4
+    assert _sample(out, "t_seconds_count", '{stage="a"}') == 4
+    assert _sample(out, "t_seconds_sum", '{stage="a"}') == 4.05
+
+def test_retries_are_counted():
+    class _Throttled(Exception):
+        status_code = 429
+        response = SimpleNamespace(headers={"retry-after": "0"})
+
+    calls = {"n": 0}
+
+    class _Completions:
+        async def create(self, **kwargs):
+            calls["n"] += 1
+            if calls["n"] == 1:
+                raise _Throttled()
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="{}"))])
+
+    llm = AsyncLLMClient(SimpleNamespace(chat=SimpleNamespace(completions=_Completions())), "gpt-4o-mini", None, None, 3, 10)
+    before = LLM_RETRIES._children[()].value
+    with traced() as trace:
+        asyncio.run(llm.complete([{"role": "user", "content": "x"}]))
+    assert LLM_RETRIES._children[()].value == before + 1
+    assert trace.retries == 1 and trace.stages["llm"] > 0
+
+def test_metrics_endpoint_exposes_stages_cache_and_spend(tmp_path):
+    s = DISettings(cache_dir=tmp_path)
+    cache = TieredCache(DiskCache(str(tmp_path)), MemoryCache())
+    llm = AsyncLLMClient(StubAsyncOpenAI(StubConfig(latency_ms=0)), s.llm_model, cache, None, 1, 10)
+    api._state.clear()
+    api._state.update({"s": s, "cache": cache, "aext": AsyncSchemaExtractor(llm, s, cache=cache)})
+    try:
+        client = TestClient(api.app)
+        before = client.get("/metrics").text
+        for _ in range(2):
+            r = client.post("/extract", json={"schema": "contract", "raw_text": "Agreement with Alpha Widgets.", "doc_id": "d1"})
+            assert r.status_code == 200
+        r = client.get("/metrics")
+    finally:
+        api._state.clear()
+        cache.close()
+
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    out = r.text
+    for stage in ("ingest", "chunking", "prompt_build", "llm", "json_parse", "validation"):
+        name = 'docintel_stage_seconds_count'
+        label = f'{{stage="{stage}"}}'
+        assert _sample(out, name, label) > (_sample(before, name, label) if f"{name}{label}" in before else 0)
+    # The second request is answered by the memory tier.
+    assert _sample(out, "docintel_cache_hits_total", '{tier="memory"}') == 1
+    assert _sample(out, "docintel_cache_misses_total", '{tier="disk"}') >= 2
+    assert _sample(out, "docintel_completions_total") == 1
+    assert _sample(out, "docintel_repair_call_rate") == 0
+    assert _sample(out, "docintel_llm_tokens_total", '{direction="in"}') > 0
+    assert _sample(out, "docintel_llm_cost_usd_total") > 0
+    # Only the scrape itself is in flight.
+    assert _sample(out, "docintel_http_requests_in_flight") == 1
+
+def test_debug_header_returns_timing_breakdown_and_profile(tmp_path):
+    s = DISettings(cache_dir=tmp_path, enable_cache=False, profile_sample_rate=1.0)
+    llm = AsyncLLMClient(StubAsyncOpenAI(StubConfig(latency_ms=0)), s.llm_model, None, None, 1, 10)
+    api._state.clear()
+    api._state.update({"s": s, "cache": None, "aext": AsyncSchemaExtractor(llm, s)})
+    try:
+        client = TestClient(api.app)
+        body = {"schema": "contract", "raw_text": "Agreement with Alpha Widgets.", "doc_id": "d1"}
+        plain = client.post("/extract", json=body).json()
+        r = client.post("/extract", json=body, headers={"X-Debug": "1"})
+        by_field = client.post("/extract", json={**body, "debug": True}).json()
+    finally:
+        api._state.clear()
+
+    assert plain["debug"] is None
+    debug = r.json()["debug"]
+    assert {"ingest", "chunking", "prompt_build", "tokenize", "llm", "json_parse", "validation"} <= set(debug["timings_ms"])
+    assert debug["retries"] == 0
+    assert debug["total_ms"] >= debug["timings_ms"]["llm"]
+    assert by_field["debug"]["timings_ms"]
+    profiles = sorted((tmp_path / "profiles").glob("*.prof"))
+    # Profiling is independent of debug mode; debug responses only tell you where the dump went.
+    assert len(profiles) == 3
+    assert debug["profile"] in {str(p) for p in profiles}
+
+def test_request_trace_adds_exactly_across_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from docintel.telemetry import RequestTrace
+
+    trace = RequestTrace()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: (trace.add("ingest", 1.0), trace.add_retry()), range(5000)))
+    assert trace.snapshot() == ({"ingest": 5000.0}, 5000)
@@ -0,0 +1,46 @@
+import asyncio
+
+import regex
+
+from docintel.metrics import TokenEstimator
+
+_CL100K_PAT = regex.compile(r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s""")
+
+class PretokenEncoding:
+    def __init__(self):
+        self.chars = 0
+
+    def encode_ordinary(self, text):
+        self.chars += len(text)
+        return _CL100K_PAT.findall(text)
+
+class PretokenEstimator(TokenEstimator):
+    offload_chars = 100
+
+    def __init__(self):
+        super().__init__("test-model")
+        self.enc = PretokenEncoding()
+
+    @property
+    def _enc(self):
+        return self.enc
+
+def test_count_joined_is_exact_and_memoizes_static_segments():
+    est = PretokenEstimator()
+    system = 'Rules.\n\nJSON schema:\n{"a":1}'
+    docs = ['{"doc":"one two"}', '{"doc":"three  four\\n"}']
+    for doc in docs:
+        assert est.count_joined([system, doc]) == est.count(system + "\n" + doc)
+
+    est.enc.chars = 0
+    est.count_joined([system, docs[0]])
+    assert est.enc.chars == 0
+
+    awkward = [system, " leading space", "/path"]
+    assert est.count_joined(awkward) == est.count("\n".join(awkward))
+
+def test_async_counts_match_sync():
+    est = PretokenEstimator()
+    big = "word " * 500
+    assert asyncio.run(est.acount(big)) == est.count(big)
+    assert asyncio.run(est.acount_joined(["sys", big])) == est.count("sys\n" + big)